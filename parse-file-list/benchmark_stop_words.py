@@ -0,0 +1,90 @@
+"""Compare the speed of the text clean up in stop_words.py with the earlier version in the read-files scripts
+
+The earlier version (copied below as original_text_to_clean_list, with the stop words already loaded)
+replaced each punctuation character separately, split with re.split, and then removed empty strings and stop words
+in Python loops over a list. Both versions are run on the same synthetic documents,
+which include the text of test_input_directory, and the script stops if they do not give exactly the same words.
+
+Parameters:
+    document_mb (optional): the size of each synthetic document in MB, default is 2
+    document_count (optional): the number of synthetic documents, default is 5
+"""
+import os
+import random
+import re
+import sys
+import time
+
+from stop_words import get_stop_words, REMOVE_CHARACTERS, REMOVE_WHITESPACE, texts_to_clean_lists
+
+
+def original_text_to_clean_list(text_string, remove_characters, stop_words):
+    """The clean up from the read-files scripts before stop_words.py, for comparison"""
+    text_string = text_string.lower()
+    for character in remove_characters:
+        text_string = text_string.replace(character, '')
+    text_list = re.split('[\n ]', text_string)
+    text_list = [x for x in text_list if x]
+    clean_text_list = []
+    for word in text_list:
+        if word not in stop_words:
+            clean_text_list.append(word)
+    return clean_text_list
+
+
+def make_documents(document_mb, document_count):
+    """Make synthetic documents from the test_input_directory text, stop words, punctuation, and random words"""
+    extracted = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'read-files', 'test_input_directory',
+                             'extracted_text_tika', 'test_input_directory_text.txt')
+    with open(extracted) as f:
+        sample_words = f.read().replace('|', ' ').split()
+
+    # Includes the odd splits in the test expectations, like "PD F" and "T est", and tabs and carriage returns.
+    pieces = sample_words + sorted(get_stop_words()) + ['PD F', 'T est.', 'One!', 'two?', 'a,b;c', 'Line\r\n',
+                                                        '\tTab', 'CAPITAL', 'résumé', '  ', '\n\n']
+    random.seed(0)
+    documents = []
+    for document in range(document_count):
+        words = []
+        size = 0
+        while size < document_mb * 1024 * 1024:
+            piece = random.choice(pieces) if random.random() < 0.9 else f'word{random.randint(0, 50000)}'
+            words.append(piece)
+            size += len(piece) + 1
+        documents.append(' '.join(words))
+    return documents
+
+
+def time_function(function):
+    """Run a function and return the result and the number of seconds it took"""
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+
+    # Assigns script arguments to variables.
+    document_mb = float(sys.argv[1]) if len(sys.argv) > 1 else 2
+    document_count = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    stop_words = get_stop_words()
+    stop_words_list = list(stop_words)
+    documents = make_documents(document_mb, document_count)
+    total_mb = sum(len(document) for document in documents) / 1024 / 1024
+
+    for label, remove_characters in (('manual', REMOVE_CHARACTERS),
+                                     ('tika and textract', REMOVE_CHARACTERS + REMOVE_WHITESPACE)):
+        original, original_seconds = time_function(
+            lambda: [original_text_to_clean_list(document, remove_characters, stop_words_list)
+                     for document in documents])
+        new, new_seconds = time_function(lambda: texts_to_clean_lists(documents, remove_characters, stop_words))
+
+        if new != original:
+            print(f'\nThe words are not the same for the {label} characters.')
+            sys.exit(1)
+
+        print(f'\nClean up with the {label} characters, {document_count} documents, {total_mb:.1f} MB:')
+        print(f'Original: {original_seconds:.3f} seconds ({total_mb / original_seconds:.1f} MB/sec)')
+        print(f'New:      {new_seconds:.3f} seconds ({total_mb / new_seconds:.1f} MB/sec)')
+        print(f'Speedup:  {original_seconds / new_seconds:.1f}x, with the same words')
@@ -3,29 +3,65 @@
 For initial testing, using a single text file, with path provided as an argument.
 Real data may be multiple text files in a single folder
 or may need to search a folder recursively for text files that match a naming convention.
+The folder mode does that: it finds every file in a folder and its subfolders that matches DIRECTORY_PRINT_PATTERN,
+counts the words in each one with a pool of processes, and saves one CSV of counts for each collection.
+The collection is the folder the directory print is in, relative to the folder that is searched,
+so several directory prints in the same folder are merged.
+
+The file is read one path at a time and the words are made with generators (iter_lines and iter_words),
+so a directory print with tens of millions of paths does not need to fit in memory.
+The count mode keeps only the number of times each word is used, overall and per top-level folder (term_counts.py).
+
+By default, the folders at the start of every path in a directory print (like C:\\Users\\Desktop) are found
+and skipped automatically (common_prefix), with one extra read of the file, so the skip number does not need
+to be worked out by hand. In the folder mode, this is done separately for each directory print.
 
 Parameters:
-    path_doc (required) : the path to the text file with the directory print
-    skip_number (required) : the number of spaces at the beginning of each path to not include
+    path_doc (required) : the path to the text file with the directory print, or the folder to search for the folder mode
+    skip_number (optional) : the number of items at the beginning of each path to not include,
+                             or auto (default) to skip the folders that are at the start of every path
+    mode (optional) : list (default) makes the list of words and tests it,
+                      stream prints each word on its own line as it is made, without keeping the list
+                      count prints the most common words overall and for each top-level folder
+                      folder counts every directory print in the path_doc folder, merged by collection
+    output_path (optional) : for the count mode, the path to save the counts to as a CSV,
+                             and for the folder mode, the folder to save the CSVs to (default is path_doc)
+    workers (optional) : for the folder mode, the number of processes to use, default is the number of CPUs
 """
+from collections import Counter
+import fnmatch
+from multiprocessing import Pool
 import os
-import pandas as pd
 import re
+from stop_words import get_stop_words
 import sys
+import time
+from term_counts import TermCounts
+
+# Splits on dashes, underscores, spaces, periods, and backslashes.
+PATH_SPLIT_PATTERN = re.compile(r'[-_ .\\]')
+
+# File names (lowercase) that are directory prints, for the folder mode.
+DIRECTORY_PRINT_PATTERN = '*.txt'
 
 
 def doc_to_lines_list(doc):
     """Convert a text file into a list with one item (string) per row."""
+    return list(iter_lines(doc))
+
+
+def iter_lines(doc):
+    """Read a text file one row at a time, yielding each row (string) without the line ending."""
     with open(doc) as doc_open:
-        doc_list = doc_open.read().splitlines()
-    return doc_list
+        for line in doc_open:
+            yield line.rstrip('\n')
 
 
-def path_to_words_list(row):
+def path_to_words_list(row, skip_number):
     """Convert a path (string) to a list of words/strings."""
 
     # Splits on dashes, underscores, spaces, periods, and backslashes.
-    row_list = re.split(r'[-_ .\\]', row)
+    row_list = PATH_SPLIT_PATTERN.split(row)
 
     # Removes the specified number of items from the beginning of the list that are the same for every path.
     row_list = row_list[skip_number:]
@@ -36,22 +72,226 @@ def path_to_words_list(row):
     return row_list
 
 
-def remove_stop_words(list_words):
-    """Remove stop words from the word list."""
+def common_prefix(paths):
+    """Find the folders that are at the start of every path, reading the paths once
+
+    The prefix only gets shorter as more paths are read, so this keeps the folders that every path so far has in common
+    and stops reading as soon as there are none. Blank rows are ignored and the last item of each path is treated
+    as a file name, so the prefix is never a whole path, even for a directory print with one path.
+
+    :parameter
+        paths : the paths (iterable of strings), like iter_lines(path_doc)
+
+    :return
+        The folders in the prefix, in order (list of strings), which is empty if the paths have nothing in common
+    """
+    prefix = None
+    for path in paths:
+        if not path:
+            continue
+        folders = path.split('\\')[:-1]
+        if prefix is None:
+            prefix = folders
+        else:
+            # Shortens the prefix to the folders it has in common with this path.
+            shared = 0
+            for prefix_folder, folder in zip(prefix, folders):
+                if prefix_folder != folder:
+                    break
+                shared += 1
+            del prefix[shared:]
+        if not prefix:
+            break
+    return prefix or []
+
+
+def prefix_skip_number(prefix):
+    """Calculate the number of items in a prefix from common_prefix, to use as the skip number (integer)"""
+    if not prefix:
+        return 0
+    return len(PATH_SPLIT_PATTERN.split('\\'.join(prefix)))
+
+
+def find_skip_number(doc):
+    """Calculate the skip number for a directory print from the folders at the start of every path (integer)"""
+    return prefix_skip_number(common_prefix(iter_lines(doc)))
 
-    # Reads the stop words, which are in the "Term" column of the stop_list.csv file in this repo.
-    df = pd.read_csv(os.path.join(os.getcwd(), 'stop_list.csv'))
-    stop_words = df['Term'].to_list()
 
-    # Makes a list of every word that is not in stop_words.
-    reduced_words = []
-    for word in list_words:
-        if word not in stop_words:
-            reduced_words.append(word)
-    return reduced_words
+def iter_words(paths, skip_number, stop_words=None):
+    """Yield the words from each path, in order, without stop words
+
+    :parameter
+        paths : the paths (iterable of strings), like iter_lines(path_doc)
+        skip_number : the number of items at the beginning of each path to not include (integer)
+        stop_words : the words to remove (set), default is the words from stop_list.csv
+
+    :return
+        Generator of words (strings)
+    """
+    if stop_words is None:
+        stop_words = get_stop_words()
+    for path in paths:
+        for word in PATH_SPLIT_PATTERN.split(path.lower())[skip_number:]:
+            if word not in stop_words:
+                yield word
+
+
+def top_level_folder(path, skip_number, path_items=None):
+    """Find the name of the first folder in the path after the items that are skipped
+
+    :parameter
+        path : the path (string)
+        skip_number : the number of items at the beginning of each path to not include (integer)
+        path_items : the path split with PATH_SPLIT_PATTERN (list of strings), if already made
+
+    :return
+        The folder name (string), or an empty string if the path is to a file that is not in a folder after the skip
+    """
+    if path_items is None:
+        path_items = PATH_SPLIT_PATTERN.split(path)
+    if skip_number >= len(path_items):
+        return ''
+
+    # Finds where the first item after the skip starts (each item is followed by one split character)
+    # and returns the whole folder name around it, even if the skip ends partway through the folder name.
+    start = sum(map(len, path_items[:skip_number])) + skip_number
+    end = path.find('\\', start)
+    if end == -1:
+        return ''
+    return path[path.rfind('\\', 0, start) + 1:end]
+
+
+def count_terms(paths, skip_number, stop_words=None):
+    """Count the words from each path, overall and for each top-level folder, without stop words
+
+    :parameter
+        paths : the paths (iterable of strings), like iter_lines(path_doc)
+        skip_number : the number of items at the beginning of each path to not include (integer)
+        stop_words : the words to remove (set), default is the words from stop_list.csv
+
+    :return
+        The term counts (TermCounts)
+    """
+    if stop_words is None:
+        stop_words = get_stop_words()
+    term_counts = TermCounts()
+    for path in paths:
+        path_items = PATH_SPLIT_PATTERN.split(path)
+        words = [word for word in map(str.lower, path_items[skip_number:]) if word not in stop_words]
+        term_counts.add(top_level_folder(path, skip_number, path_items), words)
+    return term_counts
+
 
+def print_term_counts(term_counts, number=10):
+    """Print the most common words overall and for each top-level folder"""
+    print(f"\nMost common words overall: {term_counts.most_common(number)}")
+    for folder in sorted(term_counts.folders):
+        print(f"{folder or '(not in a folder)'}: {term_counts.most_common(number, folder)}")
 
-def test_result():
+
+def find_directory_prints(root, pattern=DIRECTORY_PRINT_PATTERN):
+    """Find every file in a folder and its subfolders with a name that matches the pattern
+
+    :parameter
+        root : path to the folder to search (string)
+        pattern : the pattern for the lowercase file name, with * and ? wildcards (string)
+
+    :return
+        Generator of paths (strings), in alphabetical order within each folder
+    """
+    for folder, subfolders, files in os.walk(root):
+        subfolders.sort()
+        for file in sorted(files):
+            if fnmatch.fnmatch(file.lower(), pattern):
+                yield os.path.join(folder, file)
+
+
+def collection_name(print_path, root):
+    """Name the collection for a directory print, which is its folder relative to root, or the root folder name"""
+    folder = os.path.relpath(os.path.dirname(print_path), root)
+    if folder == '.':
+        folder = os.path.basename(os.path.abspath(root))
+    return folder.replace(os.sep, '_')
+
+
+def count_print(job):
+    """Count the words in one directory print, for count_collections
+
+    :parameter
+        job : the collection name, path to the directory print, and skip number or None to find it (tuple)
+
+    :return
+        The collection name, path to the directory print, and number of paths (tuple) and the term counts (TermCounts)
+    """
+    collection, print_path, skip_number = job
+    if skip_number is None:
+        skip_number = find_skip_number(print_path)
+    path_count = 0
+
+    def counted_lines():
+        nonlocal path_count
+        for line in iter_lines(print_path):
+            path_count += 1
+            yield line
+
+    term_counts = count_terms(counted_lines(), skip_number)
+    return (collection, print_path, path_count), term_counts
+
+
+def count_collections(root, skip_number, workers=None):
+    """Count the words in every directory print in a folder and its subfolders, merged by collection
+
+    Each directory print is counted by a separate process and the counts are merged as each one finishes,
+    with a progress message for each directory print.
+
+    :parameter
+        root : path to the folder to search (string)
+        skip_number : the number of items at the beginning of each path to not include (integer),
+                      or None to skip the folders at the start of every path, found for each directory print
+        workers : the number of processes (integer), default is the number of CPUs
+
+    :return
+        Dictionary with the collection name as the key and the term counts (TermCounts) as the value
+    """
+    jobs = [(collection_name(print_path, root), print_path, skip_number) for print_path in find_directory_prints(root)]
+    collections = {}
+    total_paths = 0
+    start = time.perf_counter()
+    with Pool(workers) as pool:
+        results = pool.imap_unordered(count_print, jobs)
+        for done, ((collection, print_path, path_count), term_counts) in enumerate(results, start=1):
+            collections.setdefault(collection, TermCounts()).update(term_counts)
+            total_paths += path_count
+            seconds = time.perf_counter() - start
+            print(f"Finished {done} of {len(jobs)} directory prints, {total_paths:,} paths in {seconds:.1f} seconds"
+                  f" ({total_paths / seconds:,.0f} paths/second): {print_path}")
+    return collections
+
+
+def iter_term_counts(words, report_every=100000):
+    """Count words as they are made, yielding the running counts every report_every words and at the end
+
+    The same Counter is yielded each time and keeps being updated, so copy it if an earlier count is needed.
+
+    :parameter
+        words : the words to count (iterable of strings), like iter_words()
+        report_every : the number of words between each yield (integer)
+
+    :return
+        Generator of the running term counts (Counter)
+    """
+    counts = Counter()
+    since_report = 0
+    for word in words:
+        counts[word] += 1
+        since_report += 1
+        if since_report == report_every:
+            since_report = 0
+            yield counts
+    yield counts
+
+
+def test_result(word_list):
     """For the proof of concept, test that input of example_paths.txt with 3 skip words gives the expected result."""
 
     expected = ['formats', 'file', 'format', 'desktop', 'recommendations', '2022', 'held', 'trust', 'report', 'held',
@@ -65,31 +305,57 @@ def test_result():
         print(word_list)
 
 
-def word_list(paths):
+def word_list(paths, skip_number):
     """Convert a list of paths to a list of words."""
 
-    # Splits each path into a list of words and adds them to the word list.
-    words = []
-    for path in paths:
-        path_words = path_to_words_list(path)
-        words.extend(path_words)
-
-    # Removes common words and strings that do not indicate subjects, like "the" and file extensions.
-    words = remove_stop_words(words)
-    return words
+    # Splits each path into words and removes common words and strings that do not indicate subjects,
+    # like "the" and file extensions.
+    return list(iter_words(paths, skip_number))
 
 
 if __name__ == '__main__':
 
     # Assigns script arguments to variables.
     path_doc = sys.argv[1]
-    skip_number = int(sys.argv[2])
+    skip_number = sys.argv[2] if len(sys.argv) > 2 else 'auto'
+    mode = sys.argv[3] if len(sys.argv) > 3 else 'list'
+    output_path = sys.argv[4] if len(sys.argv) > 4 else None
+    workers = int(sys.argv[5]) if len(sys.argv) > 5 else None
 
-    # Reads the text file into a list.
-    path_list = doc_to_lines_list(path_doc)
+    # Finds the skip number from the paths, unless it was given.
+    # The folder mode finds it separately for each directory print, since they can have different prefixes.
+    if skip_number != 'auto':
+        skip_number = int(skip_number)
+    elif mode == 'folder':
+        skip_number = None
+    else:
+        skip_number = find_skip_number(path_doc)
+        if mode != 'stream':
+            print(f"Skipping the first {skip_number} items of each path")
 
-    # Converts the path list into a list of words.
-    word_list = word_list(path_list)
+    if mode == 'stream':
+        # Prints each word as it is made, so only one path is in memory at a time.
+        for word in iter_words(iter_lines(path_doc), skip_number):
+            print(word)
+    elif mode == 'count':
+        # Counts the words instead of keeping each one, overall and per top-level folder.
+        term_counts = count_terms(iter_lines(path_doc), skip_number)
+        print_term_counts(term_counts)
+        if output_path:
+            term_counts.save(output_path)
+    elif mode == 'folder':
+        # Counts every directory print in the folder, in parallel, and saves one CSV for each collection.
+        output_path = output_path or path_doc
+        os.makedirs(output_path, exist_ok=True)
+        collections = count_collections(path_doc, skip_number, workers)
+        for collection, term_counts in sorted(collections.items()):
+            collection_csv = os.path.join(output_path, f'{collection}_term_counts.csv')
+            term_counts.save(collection_csv)
+            print(f"\nSaved {collection} counts to {collection_csv}")
+            print(f"Most common words: {term_counts.most_common(10)}")
+    else:
+        # Converts the text file into a list of words, one path at a time.
+        words = word_list(iter_lines(path_doc), skip_number)
 
-    # Test that example_paths.txt gave the expected output.
-    test_result()
+        # Test that example_paths.txt gave the expected output.
+        test_result(words)
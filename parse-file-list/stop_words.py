@@ -0,0 +1,104 @@
+"""Shared stop word list and text clean up for the parse-file-list and read-files scripts
+
+The stop words are in the "Term" column of stop_list.csv, which is in the same folder as this module.
+The CSV is read the first time the stop words are needed and is kept for the rest of the process,
+so cleaning many documents only reads the CSV once.
+
+To use from a script in another folder of this repo, add this folder to sys.path before importing:
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'parse-file-list'))
+    from stop_words import text_to_clean_list
+"""
+from functools import lru_cache
+from itertools import filterfalse
+import os
+import pandas as pd
+import re
+
+# Path to the CSV of stop words, based on the location of this module instead of the current working directory.
+STOP_LIST_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stop_list.csv')
+
+# Punctuation and other non-word characters to remove from text.
+# These cannot be removed as stop words because they are not entire words.
+REMOVE_CHARACTERS = ('.', '!', '?', ',', ';')
+
+# Additional characters to remove for libraries that keep carriage returns and tabs in the text (tika and textract).
+REMOVE_WHITESPACE = ('\r', '\t')
+
+# Pattern for a word: everything between spaces and newlines, which are the only characters words are split at.
+WORD_PATTERN = re.compile('[^\n ]+')
+
+
+@lru_cache(maxsize=None)
+def get_stop_words(csv_path=STOP_LIST_PATH):
+    """Read the stop words from the CSV the first time it is called and return the same set after that
+
+    :parameter
+        csv_path : path to a CSV with the stop words in a column named Term (string), default is stop_list.csv
+
+    :return
+        The stop words (frozenset)
+    """
+    df = pd.read_csv(csv_path)
+    return frozenset(df['Term'].to_list())
+
+
+def remove_stop_words(list_words, stop_words=None):
+    """Remove stop words from a word list
+
+    :parameter
+        list_words : the words to check (list of strings)
+        stop_words : the words to remove (set), default is the words from stop_list.csv
+
+    :return
+        List of every word that is not a stop word, in the original order
+    """
+    if stop_words is None:
+        stop_words = get_stop_words()
+    return [word for word in list_words if word not in stop_words]
+
+
+@lru_cache(maxsize=None)
+def _delete_pattern(remove_characters):
+    """Compile a pattern that matches any of the characters, made once for each group of characters
+
+    A compiled pattern is used instead of a str.translate table because translate is much slower
+    when the text has any characters that are not ASCII, which is common in real documents.
+    """
+    return re.compile(f'[{re.escape("".join(remove_characters))}]')
+
+
+def text_to_clean_list(text_string, remove_characters=REMOVE_CHARACTERS, stop_words=None):
+    """Convert a string to a list of words, with some clean up
+
+    Each step goes over the whole string once, in C: lowercase, delete the characters with one compiled pattern,
+    and find the words with another compiled pattern. This gives the same words as replacing each character separately,
+    splitting at spaces and newlines and removing empty strings.
+
+    :parameter
+        text_string : text contents of a file (string)
+        remove_characters : single characters to delete before splitting into words (tuple of strings)
+        stop_words : the words to remove (set), default is the words from stop_list.csv
+
+    :return
+        List of words, lowercase and without stop words
+    """
+    if stop_words is None:
+        stop_words = get_stop_words()
+    text_string = _delete_pattern(tuple(remove_characters)).sub('', text_string.lower())
+    return list(filterfalse(stop_words.__contains__, WORD_PATTERN.findall(text_string)))
+
+
+def texts_to_clean_lists(text_strings, remove_characters=REMOVE_CHARACTERS, stop_words=None):
+    """Convert many strings to lists of words, with the same clean up as text_to_clean_list
+
+    :parameter
+        text_strings : text contents of each file (iterable of strings)
+        remove_characters : single characters to delete before splitting into words (tuple of strings)
+        stop_words : the words to remove (set), default is the words from stop_list.csv
+
+    :return
+        List with one list of words for each string, in the same order
+    """
+    if stop_words is None:
+        stop_words = get_stop_words()
+    return [text_to_clean_list(text_string, remove_characters, stop_words) for text_string in text_strings]
@@ -0,0 +1,75 @@
+"""Term frequency tables for the words in directory prints, per top-level folder and overall
+
+A directory print repeats folder names once for every file in the folder, so keeping only the count of each word
+is much smaller than the list of every word, and gives the same information for describing the files.
+Tables from several directory prints are merged with TermCounts.update, and saved to or read from a CSV with the columns
+Folder, Term and Count (save and load), so they can also be merged after being made by different runs.
+"""
+from collections import Counter
+import csv
+
+# Columns of the CSV made by TermCounts.save().
+CSV_COLUMNS = ['Folder', 'Term', 'Count']
+
+
+class TermCounts:
+    """The number of times each word is in the paths, overall and for each top-level folder
+
+    Paths that are not in a folder after the part that is skipped are counted with the folder name '' (empty string).
+    """
+
+    def __init__(self):
+        self.overall = Counter()
+        self.folders = {}
+
+    def add(self, folder, words):
+        """Count the words from one path
+
+        :parameter
+            folder : the name of the top-level folder the path is in (string)
+            words : the words from the path (list of strings)
+
+        :return
+            None
+        """
+        self.overall.update(words)
+        folder_counts = self.folders.get(folder)
+        if folder_counts is None:
+            folder_counts = self.folders[folder] = Counter()
+        folder_counts.update(words)
+
+    def update(self, other):
+        """Add the counts from another TermCounts, like one made from a different directory print"""
+        self.overall.update(other.overall)
+        for folder, folder_counts in other.folders.items():
+            self.folders.setdefault(folder, Counter()).update(folder_counts)
+
+    def most_common(self, number=None, folder=None):
+        """Get the most common words and their counts, overall or for one folder (list of tuples)"""
+        counts = self.overall if folder is None else self.folders.get(folder, Counter())
+        return counts.most_common(number)
+
+    def save(self, csv_path):
+        """Save the folder counts to a CSV, sorted by folder and then most common term first
+
+        Terms with the same count are sorted alphabetically, so the CSV is the same
+        no matter what order the paths or tables were counted in.
+        """
+        with open(csv_path, 'w', newline='', encoding='utf-8') as csv_open:
+            writer = csv.writer(csv_open)
+            writer.writerow(CSV_COLUMNS)
+            for folder in sorted(self.folders):
+                for term, count in sorted(self.folders[folder].items(), key=lambda item: (-item[1], item[0])):
+                    writer.writerow([folder, term, count])
+
+    @classmethod
+    def load(cls, csv_path):
+        """Read counts saved with save(). The overall counts are the total of the folder counts."""
+        term_counts = cls()
+        with open(csv_path, newline='', encoding='utf-8') as csv_open:
+            for row in csv.DictReader(csv_open):
+                count = int(row['Count'])
+                term_counts.overall[row['Term']] += count
+                term_counts.folders.setdefault(row['Folder'], Counter())[row['Term']] += count
+        return term_counts
+
@@ -0,0 +1,310 @@
+"""Compare the speed of the read-files backends (manual, tika, textract) on synthetic collections
+
+Makes a collection of AIP folders with txt, docx, pdf, and xps files (mixed by FORMAT_MIX) in a temporary folder,
+then reads it with each backend the same way as the scripts, saving the text with StreamingTextWriter.
+Each backend runs in its own process, so the peak memory (RSS) of one does not affect the next.
+Reports files/sec, MB/sec, peak RSS of the main process and the largest worker process, and success rate.
+
+Before the speed test, each backend reads test_input_directory, and the words are compared to the
+expected results from the proof of concept tests in the scripts (EXPECTED_COLL_TEXT) as a correctness gate.
+The order is not compared, since the order that folders are listed depends on the operating system.
+A backend that fails the check is not timed, and the script exits with code 1 after the other backends are done.
+
+The tika backend uses the Tika server at TIKA_SERVER_ENDPOINT if it is set, and otherwise the stand-in server
+in tika_stub_server.py. The stand-in only reads text, so the correctness check is not applicable and is not run.
+Backends whose libraries are not installed are skipped.
+
+Parameters:
+    aip_count (optional): the number of AIP folders in the synthetic collection, default is 5
+    files_per_aip (optional): the number of files in each AIP, default is 40
+    backends (optional): comma separated list of backends to run, default is manual,tika,textract
+    workers (optional): number of processes (manual) or concurrent requests (tika) to use, default is 1
+"""
+from multiprocessing import Process, Queue
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+
+from collection_crawler import iter_collection
+from text_writer import read_text, StreamingTextWriter, text_path
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, so peak memory is not reported.
+    resource = None
+
+# The number of files of each format in every group of files, for example 4 txt for every 1 xps.
+FORMAT_MIX = {'txt': 4, 'docx': 3, 'pdf': 2, 'xps': 1}
+
+# Words for the synthetic documents, with some stop words and punctuation so there is clean up to do.
+WORDS = ['archive', 'collection', 'correspondence', 'report', 'minutes', 'meeting', 'budget', 'university', 'georgia',
+         'campaign', 'election', 'senator', 'press', 'release', 'photograph', 'letter', 'agriculture', 'water',
+         'the', 'and', 'of', 'to', 'in', 'for', 'with', 'on', 'at', 'by', 'is', 'was']
+PUNCTUATION = ['', '', '', '', '.', ',', '!', '?', ';']
+
+# Path to the test collection with expected results.
+TEST_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_input_directory')
+
+
+def make_lines(line_count, words_per_line=12):
+    """Make lines of random words and punctuation"""
+    return [' '.join(random.choice(WORDS).capitalize() + random.choice(PUNCTUATION) for _ in range(words_per_line))
+            for _ in range(line_count)]
+
+
+def make_txt(path, lines):
+    """Make a plain text file with one line of words per line"""
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines))
+
+
+def make_docx(path, lines):
+    """Make the smallest docx that docx2txt, Tika and textract can read: one paragraph per line"""
+    paragraphs = ''.join(f'<w:p><w:r><w:t>{line}</w:t></w:r></w:p>' for line in lines)
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as docx:
+        docx.writestr('[Content_Types].xml',
+                      '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                      '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+                      '<Default Extension="rels" '
+                      'ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+                      '<Default Extension="xml" ContentType="application/xml"/>'
+                      '<Override PartName="/word/document.xml" ContentType="application/'
+                      'vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/></Types>')
+        docx.writestr('_rels/.rels',
+                      '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                      '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                      '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/'
+                      'relationships/officeDocument" Target="word/document.xml"/></Relationships>')
+        docx.writestr('word/document.xml',
+                      '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                      '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+                      f'<w:body>{paragraphs}</w:body></w:document>')
+
+
+def make_pdf(path, lines, lines_per_page=45):
+    """Make a PDF with the lines in Helvetica, lines_per_page on each page"""
+    pages = [lines[start:start + lines_per_page] for start in range(0, len(lines), lines_per_page)] or [[]]
+
+    # Objects 1-3 are the catalog, page tree and font. Each page then has a page object and a content stream.
+    page_numbers = [4 + 2 * index for index in range(len(pages))]
+    objects = [b'<< /Type /Catalog /Pages 2 0 R >>',
+               f'<< /Type /Pages /Kids [{" ".join(f"{number} 0 R" for number in page_numbers)}] '
+               f'/Count {len(pages)} >>'.encode('latin-1'),
+               b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    for number, page_lines in zip(page_numbers, pages):
+        shown = ' '.join(f"({line.replace('(', '').replace(')', '')}) '" for line in page_lines)
+        stream = f'BT /F1 11 Tf 14 TL 50 780 Td {shown} ET'.encode('latin-1')
+        objects.append(f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+                       f'/Resources << /Font << /F1 3 0 R >> >> /Contents {number + 1} 0 R >>'.encode('latin-1'))
+        objects.append(b'<< /Length %d >>\nstream\n' % len(stream) + stream + b'\nendstream')
+
+    pdf = b'%PDF-1.4\n'
+    offsets = []
+    for index, pdf_object in enumerate(objects):
+        offsets.append(len(pdf))
+        pdf += b'%d 0 obj\n' % (index + 1) + pdf_object + b'\nendobj\n'
+    xref = len(pdf)
+    pdf += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    pdf += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    pdf += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    with open(path, 'wb') as f:
+        f.write(pdf)
+
+
+def make_xps(path, lines):
+    """Make a file with the parts of an XPS package, which the manual backend cannot read"""
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as xps:
+        xps.writestr('FixedDocumentSequence.fdseq', '<FixedDocumentSequence/>')
+        xps.writestr('Documents/1/Pages/1.fpage', '<FixedPage>' + ' '.join(lines) + '</FixedPage>')
+
+
+MAKE_FILE = {'txt': make_txt, 'docx': make_docx, 'pdf': make_pdf, 'xps': make_xps}
+
+
+def make_collection(coll_directory, aip_count, files_per_aip, seed=0):
+    """Make a synthetic collection of AIP folders, each with files_per_aip files (some in a subfolder)
+
+    :return
+        The number of files and total size in bytes
+    """
+    random.seed(seed)
+    formats = [extension for extension, count in FORMAT_MIX.items() for _ in range(count)]
+    total_bytes = 0
+    for aip_number in range(aip_count):
+        aip_directory = os.path.join(coll_directory, f'aip_{aip_number:04d}')
+        os.makedirs(os.path.join(aip_directory, 'subfolder'))
+        for file_number in range(files_per_aip):
+            extension = formats[file_number % len(formats)]
+            folder = 'subfolder' if file_number % 3 == 0 else ''
+            path = os.path.join(aip_directory, folder, f'file_{file_number:05d}.{extension}')
+            MAKE_FILE[extension](path, make_lines(random.randint(10, 200)))
+            total_bytes += os.path.getsize(path)
+    return aip_count * files_per_aip, total_bytes
+
+
+def load_backend(name, workers):
+    """Import a backend and set it up
+
+    :return
+        Tuple with the function to read a file, keyword arguments for iter_collection,
+        the expected results for test_input_directory (or None if the check is not applicable),
+        and a function to call when done, which closes the Tika client and shuts down the stand-in server (or None)
+    """
+    if name == 'manual':
+        import read_files_manual
+        return read_files_manual.read, {'workers': workers}, read_files_manual.EXPECTED_COLL_TEXT, None
+    if name == 'tika':
+        import read_files_tika
+        from tika_client import TikaClient
+        server = None
+        endpoint = os.getenv('TIKA_SERVER_ENDPOINT')
+        if not endpoint:
+            from tika_stub_server import start_stub_server
+            server, endpoint = start_stub_server()
+        read_files_tika.tika_client = TikaClient(endpoint, max(workers, 1))
+        # The stand-in server only reads text, so the results from a real Tika server are not expected from it.
+        expected = None if server else read_files_tika.EXPECTED_COLL_TEXT
+
+        def close():
+            read_files_tika.tika_client.close()
+            if server:
+                server.shutdown()
+        return read_files_tika.registry.read, {'map_files': read_files_tika.tika_client.map}, expected, close
+    if name == 'textract':
+        import read_files_textract
+        return read_files_textract.registry.read, {}, None, None
+    raise ValueError(f'Unknown backend {name}')
+
+
+def read_collection(coll_directory, read_file, crawl_options):
+    """Read a collection like the scripts do, saving the text to the extracted_text folder
+
+    :return
+        The number of files read and the number of files
+    """
+    output_directory = os.path.join(coll_directory, 'extracted_text')
+    os.makedirs(output_directory, exist_ok=True)
+    coll_read = 0
+    coll_files = 0
+    with StreamingTextWriter(output_directory, os.path.basename(coll_directory)) as writer:
+        for aip, aip_files, file_texts in iter_collection(coll_directory, read_file, **crawl_options):
+            writer.start_aip(aip)
+            for file_text in file_texts:
+                if file_text:
+                    writer.write(file_text)
+                    coll_read += 1
+            writer.end_aip()
+            coll_files += aip_files
+    return coll_read, coll_files
+
+
+def check_correctness(name, read_file, crawl_options, expected, work_directory):
+    """Read a copy of test_input_directory and compare the words to the expected results
+
+    :return
+        'pass', 'FAIL', or 'not applicable' if there are no expected results for the backend
+    """
+    if expected is None:
+        return 'not applicable'
+    coll_directory = os.path.join(work_directory, f'test_input_directory_{name}')
+    shutil.copytree(TEST_DIRECTORY, coll_directory,
+                    ignore=shutil.ignore_patterns('extracted_text*'))
+    read_collection(coll_directory, read_file, crawl_options)
+    coll_text = read_text(text_path(os.path.join(coll_directory, 'extracted_text'), os.path.basename(coll_directory)))
+    return 'pass' if sorted(coll_text) == sorted(expected) else 'FAIL'
+
+
+def peak_rss_mb(who):
+    """Peak memory (RSS) in MB for this process (resource.RUSAGE_SELF) or its largest child (RUSAGE_CHILDREN)"""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux.
+    return max_rss / 1024 / 1024 if sys.platform == 'darwin' else max_rss / 1024
+
+
+def run_backend(name, coll_directory, work_directory, workers, results):
+    """Run one backend in this process and put its statistics on the results queue"""
+    try:
+        read_file, crawl_options, expected, close = load_backend(name, workers)
+    except ImportError as error:
+        results.put({'backend': name, 'skipped': f'library not installed ({error.name})'})
+        return
+
+    try:
+        correctness = check_correctness(name, read_file, crawl_options, expected, work_directory)
+        if correctness == 'FAIL':
+            # The speed of a backend that gives the wrong words is not reported.
+            results.put({'backend': name, 'correctness': correctness})
+            return
+
+        # Reads a copy, so the extracted_text folder from one backend is not in the collection for the next.
+        backend_directory = os.path.join(work_directory, f'{os.path.basename(coll_directory)}_{name}')
+        shutil.copytree(coll_directory, backend_directory)
+        start = time.perf_counter()
+        coll_read, coll_files = read_collection(backend_directory, read_file, crawl_options)
+        seconds = time.perf_counter() - start
+    finally:
+        if close:
+            close()
+    results.put({'backend': name, 'seconds': seconds, 'read': coll_read, 'files': coll_files,
+                 'correctness': correctness, 'rss_main': peak_rss_mb(resource.RUSAGE_SELF) if resource else None,
+                 'rss_worker': peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None})
+
+
+def print_result(result, total_mb):
+    """Print the statistics for one backend"""
+    print(f"\n{result['backend']}:")
+    if 'skipped' in result:
+        print(f"Skipped, {result['skipped']}")
+        return
+    print(f"Correctness check with test_input_directory: {result['correctness']}")
+    if result['correctness'] == 'FAIL':
+        print("Not timed, since the words from test_input_directory were not the expected results")
+        return
+    seconds = result['seconds']
+    print(f"{result['files'] / seconds:.1f} files/sec, {total_mb / seconds:.2f} MB/sec ({seconds:.2f} seconds)")
+    if result['rss_main'] is not None:
+        print(f"Peak RSS: {result['rss_main']:.1f} MB main process, {result['rss_worker']:.1f} MB largest worker")
+    percent_success = round((result['read'] / result['files']) * 100, 2)
+    print(f"Success rate: {result['read']} files out of {result['files']} read ({percent_success}%)")
+
+
+if __name__ == '__main__':
+
+    # Assigns script arguments to variables.
+    aip_count = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    files_per_aip = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    backends = sys.argv[3].split(',') if len(sys.argv) > 3 else ['manual', 'tika', 'textract']
+    workers = int(sys.argv[4]) if len(sys.argv) > 4 else 1
+
+    with tempfile.TemporaryDirectory() as work_directory:
+        coll_directory = os.path.join(work_directory, 'synthetic_collection')
+        file_count, total_bytes = make_collection(coll_directory, aip_count, files_per_aip)
+        total_mb = total_bytes / 1024 / 1024
+        print(f'Synthetic collection: {aip_count} AIPs, {file_count} files, {total_mb:.2f} MB, mix {FORMAT_MIX}')
+
+        # Backends that failed the correctness check or stopped with an error, for the exit code.
+        failed = []
+        for backend in backends:
+            results = Queue()
+            process = Process(target=run_backend, args=(backend, coll_directory, work_directory, workers, results))
+            process.start()
+            process.join()
+            if results.empty():
+                print(f'\n{backend}:\nStopped with an error (exit code {process.exitcode})')
+                failed.append(backend)
+            else:
+                result = results.get()
+                print_result(result, total_mb)
+                if result.get('correctness') == 'FAIL':
+                    failed.append(backend)
+
+    if failed:
+        print(f"\nFailed: {', '.join(failed)}")
+        sys.exit(1)
@@ -0,0 +1,89 @@
+"""Find and read every file in a collection, one AIP at a time, with an optional process pool
+
+A collection folder contains AIP folders, and each AIP folder contains files, which may be in subfolders.
+The output folders made by the read-files scripts (extracted_text and variations) are skipped.
+
+With more than one worker, the files are sent to a process pool as one ordered stream for the whole collection,
+so a worker does not wait for the other files of an AIP to finish before starting on the next AIP.
+The results are returned in the same order as reading the files one at a time,
+so the saved text and the success rates are the same for any number of workers.
+"""
+from itertools import islice
+from multiprocessing import Pool
+import os
+
+
+def list_aip_files(coll_directory):
+    """Make a list of the paths to every file in each AIP in the collection
+
+    :parameter
+        coll_directory : path to folder for a collection, which contains AIP folders (string)
+
+    :return
+        A list of tuples with the AIP folder name (string) and a list of the paths to its files (list of strings),
+        in the order that os.listdir and os.walk find them
+    """
+    aips = []
+    for aip in os.listdir(coll_directory):
+
+        # Skip the output folders. During testing, each technique had a different output folder.
+        if aip.startswith('extracted_text'):
+            continue
+
+        aip_paths = []
+        for root, dirs, files in os.walk(os.path.join(coll_directory, aip)):
+            for file in files:
+                aip_paths.append(os.path.join(root, file))
+        aips.append((aip, aip_paths))
+    return aips
+
+
+def iter_collection(coll_directory, read_file, workers=1, chunksize=16, map_files=None, manifest=None):
+    """Read every file in the collection, giving the results for each AIP as they are read
+
+    :parameter
+        coll_directory : path to folder for a collection, which contains AIP folders (string)
+        read_file : function that takes the path to a file and returns a list of words or None if it cannot be read.
+                    To use more than one worker, it must be defined at the top level of a module so it can be pickled.
+        workers : the number of processes to read files with (integer), default is 1 which does not start a pool
+        chunksize : the number of files to send to a worker at once when workers is more than 1 (integer)
+        map_files : function used instead of the process pool, which takes read_file and an iterable of paths
+                    and returns the results in the same order, for example TikaClient.map to read with threads
+        manifest : ExtractionManifest for the collection, to only read files that are new or changed since the last run
+
+    :return
+        Generator of tuples, one per AIP, with the AIP folder name (string), the number of files in the AIP (integer),
+        and an iterator with the result of read_file for each file in the AIP, including None for files not read.
+        The iterator for an AIP can only be used until the next AIP is requested.
+    """
+    aips = list_aip_files(coll_directory)
+    all_paths = (path for aip, aip_paths in aips for path in aip_paths)
+
+    if map_files:
+        yield from _split_by_aip(aips, _read_paths(all_paths, read_file, map_files, manifest))
+    elif workers > 1:
+        with Pool(workers) as pool:
+            # imap keeps the results in the same order as the paths.
+            def map_pool(function, paths):
+                return pool.imap(function, paths, chunksize)
+            yield from _split_by_aip(aips, _read_paths(all_paths, read_file, map_pool, manifest))
+    else:
+        yield from _split_by_aip(aips, _read_paths(all_paths, read_file, map, manifest))
+
+
+def _read_paths(paths, read_file, map_paths, manifest):
+    """Read every path with map_paths, skipping the files already in the manifest if there is one"""
+    if manifest:
+        return manifest.read_through(paths, read_file, map_paths)
+    return iter(map_paths(read_file, paths))
+
+
+def _split_by_aip(aips, results):
+    """Split the ordered stream of file results back into one iterator per AIP"""
+    for aip, aip_paths in aips:
+        file_texts = islice(results, len(aip_paths))
+        yield aip, len(aip_paths), file_texts
+
+        # Skips any results for this AIP that were not used, so the next AIP starts at its own first file.
+        for file_text in file_texts:
+            pass
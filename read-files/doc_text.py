@@ -0,0 +1,135 @@
+"""Get the text of a Microsoft Word 97-2003 (.doc) file without converting it to .docx first
+
+A .doc file is an OLE2 compound file. The text is in the WordDocument stream, in pieces that are described
+by the piece table (the Clx) in the 0Table or 1Table stream. Each piece is either 8-bit (Windows-1252)
+or UTF-16 text. This follows the Microsoft [MS-DOC] specification for finding the text, reads everything
+in memory, and never writes to the folder with the file, so it works on read-only storage and without Word.
+
+Word 6 and earlier (which use a different format) and encrypted documents are not supported.
+"""
+import olefile
+import struct
+
+# Offsets in the File Information Block (FIB) at the start of the WordDocument stream.
+FIB_IDENT = 0x0000
+FIB_FLAGS = 0x000A
+FIB_FC_CLX = 0x01A2
+
+# Value of the FIB wIdent for a Word document, and the flags for an encrypted document and the table stream to use.
+WORD_IDENT = 0xA5EC
+FLAG_ENCRYPTED = 0x0100
+FLAG_1TABLE = 0x0200
+
+# Word uses control characters for document structure. These are changed to the characters in plain text
+# with the same meaning, so words are still separated (for example, at the end of paragraphs and table cells).
+CONTROL_CHARACTERS = {
+    '\r': '\n',      # End of paragraph.
+    '\x07': '\n',    # End of table cell or row.
+    '\x0b': '\n',    # Line break.
+    '\x0c': '\n',    # Page or section break.
+    '\x0e': '\n',    # Column break.
+    '\t': ' ',       # Tab.
+    '\x1e': '-',     # Non-breaking hyphen.
+    '\x1f': '',      # Optional hyphen.
+    '\x01': '',      # Picture.
+    '\x02': '',      # Footnote or endnote reference.
+    '\x05': '',      # Comment reference.
+    '\x08': '',      # Drawing.
+}
+TRANSLATE_CONTROL = str.maketrans(CONTROL_CHARACTERS)
+
+# Characters that mark fields, like page numbers or hyperlinks: begin, separator between code and result, and end.
+FIELD_BEGIN = '\x13'
+FIELD_SEPARATOR = '\x14'
+FIELD_END = '\x15'
+
+
+def read_doc_text(path):
+    """Get the text of a .doc file
+
+    :parameter
+        path : path to a file (string)
+
+    :return
+        The text of the document, with Word control characters changed to plain text (string)
+
+    :raises
+        ValueError : if the file is not a Word 97-2003 document or is encrypted
+    """
+    if not olefile.isOleFile(path):
+        raise ValueError('Not an OLE2 file')
+
+    with olefile.OleFileIO(path) as ole:
+        if not ole.exists('WordDocument'):
+            raise ValueError('No WordDocument stream')
+        word_document = ole.openstream('WordDocument').read()
+
+        ident, = struct.unpack_from('<H', word_document, FIB_IDENT)
+        flags, = struct.unpack_from('<H', word_document, FIB_FLAGS)
+        if ident != WORD_IDENT:
+            raise ValueError('Not a Word 97-2003 document')
+        if flags & FLAG_ENCRYPTED:
+            raise ValueError('Encrypted document')
+
+        table_name = '1Table' if flags & FLAG_1TABLE else '0Table'
+        if not ole.exists(table_name):
+            raise ValueError(f'No {table_name} stream')
+        table = ole.openstream(table_name).read()
+
+    fc_clx, lcb_clx = struct.unpack_from('<II', word_document, FIB_FC_CLX)
+    text = ''.join(_iter_pieces(word_document, table[fc_clx:fc_clx + lcb_clx]))
+    return _remove_field_codes(text).translate(TRANSLATE_CONTROL)
+
+
+def _iter_pieces(word_document, clx):
+    """Get the text of each piece in the piece table, in document order"""
+
+    # Skips the property modifiers (Prc), which start with 0x01, to get to the piece table (Pcdt), starting with 0x02.
+    position = 0
+    while position < len(clx) and clx[position] == 0x01:
+        cb_grpprl, = struct.unpack_from('<h', clx, position + 1)
+        position += 3 + cb_grpprl
+    if position >= len(clx) or clx[position] != 0x02:
+        raise ValueError('No piece table')
+
+    # The piece table has n + 1 character positions (4 bytes each) followed by n piece descriptors (8 bytes each).
+    lcb, = struct.unpack_from('<I', clx, position + 1)
+    plc_pcd = clx[position + 5:position + 5 + lcb]
+    piece_count = (lcb - 4) // 12
+    character_positions = struct.unpack_from(f'<{piece_count + 1}I', plc_pcd, 0)
+
+    for index in range(piece_count):
+        character_count = character_positions[index + 1] - character_positions[index]
+        fc, = struct.unpack_from('<I', plc_pcd, 4 * (piece_count + 1) + 8 * index + 2)
+
+        # Bit 30 of fc means the piece is 8-bit text, at half of the rest of fc.
+        if fc & 0x40000000:
+            offset = (fc & ~0x40000000) // 2
+            yield word_document[offset:offset + character_count].decode('cp1252', errors='replace')
+        else:
+            yield word_document[fc:fc + 2 * character_count].decode('utf-16-le', errors='replace')
+
+
+def _remove_field_codes(text):
+    """Remove field codes, keeping the field results, which is the text shown in the document
+
+    Fields can be nested, so this tracks whether each open field is still in its code or has reached its result.
+    """
+    if FIELD_BEGIN not in text:
+        return text
+
+    kept = []
+    fields = []
+    in_code = 0
+    for character in text:
+        if character == FIELD_BEGIN:
+            fields.append(True)
+            in_code += 1
+        elif character == FIELD_SEPARATOR and fields and fields[-1]:
+            fields[-1] = False
+            in_code -= 1
+        elif character == FIELD_END and fields:
+            in_code -= fields.pop()
+        elif not in_code:
+            kept.append(character)
+    return ''.join(kept)
@@ -0,0 +1,229 @@
+"""Remember which files have already been read, so a new run only reads files that are new or changed
+
+The manifest is saved in the extracted_text folder of the collection and has two files:
+    manifest.jsonl : one line per file with the path (relative to the collection folder), the reader key, size,
+                     modification time, SHA-256 hash of the contents, and where its words are in tokens.jsonl
+    tokens.jsonl : one line per file read, with the list of words (cleaned up)
+
+The reader key (from reader_key) names the backend and the settings that change the words it makes,
+like the stop words and the PDF page limits. Only entries with the same reader key are used, so each backend
+(for example read_files_manual.py and read_files_tika.py) can share the folder without using the other one's words,
+and changing a setting reads every file again.
+
+A file is not read again if its size and modification time are the same as in the manifest,
+or if its hash is the same as when it was read before (for example, a file that was only touched).
+The hash is calculated next to the read, in the worker process or thread, so the files are only hashed in parallel.
+A new file with the same contents as another file (like a copy) is read, but its words are only saved once.
+Files that could not be read (None) or were only partly read (IncompleteText, for example when a PDF page timed out)
+are not saved, so they are tried again in the next run.
+Both files are only added to, and each line is saved as soon as a file is read,
+so a run that stops partway through continues from the last file saved when it is run again.
+Delete both files to read every file again.
+"""
+from collections import namedtuple
+import hashlib
+import json
+import os
+
+# Information about a file from the manifest check.
+# tokens_ref is the location of the words in tokens.jsonl, or None if the file has to be read.
+# sha256 is the hash of the contents, or for a file that changed size or modification time, the hash it had before.
+FileCheck = namedtuple('FileCheck', ['path', 'rel_path', 'size', 'mtime', 'sha256', 'tokens_ref', 'is_recorded'])
+
+
+class IncompleteText(list):
+    """Words from a file that was only partly read, for example when a PDF page took too long and was skipped
+
+    They are used like any other list of words, but are not saved to the manifest, so the file is read again next run.
+    """
+
+
+def reader_key(backend, stop_words=None, **settings):
+    """Make the key for the reader that makes the words, so words made by another reader or settings are not used
+
+    :parameter
+        backend : the name of the script or library that reads the files (string)
+        stop_words : the stop words removed by the clean up (set), which are saved as a hash, or None
+        settings : other settings that change the words, like the characters removed or the PDF page limit
+
+    :return
+        The key (string)
+    """
+    key = {'backend': backend, **settings}
+    if stop_words is not None:
+        key['stop_words'] = hashlib.sha256('\n'.join(sorted(stop_words)).encode('utf-8')).hexdigest()
+    return json.dumps(key, sort_keys=True)
+
+
+class ExtractionManifest:
+    """Manifest of the files already read in a collection, with the words from each one
+
+    :parameter
+        output_directory : path to the extracted_text folder (string)
+        coll_directory : path to folder for the collection, which the paths in the manifest are relative to (string)
+        reader : the reader key, from reader_key, for the words made in this run (string)
+    """
+
+    def __init__(self, output_directory, coll_directory, reader):
+        self.coll_directory = coll_directory
+        self.reader = reader
+        self.manifest_path = os.path.join(output_directory, 'manifest.jsonl')
+        self.tokens_path = os.path.join(output_directory, 'tokens.jsonl')
+
+        # Reads what earlier runs saved with the same reader key. Later lines replace earlier lines for the same path.
+        # Lines from other readers, or from before there was a reader key, are skipped.
+        self.entries = {}
+        self.tokens_by_hash = {}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # The last line may be incomplete if the run stopped while it was being saved.
+                        continue
+                    if entry.get('reader') != reader:
+                        continue
+                    self.entries[entry['path']] = entry
+                    self.tokens_by_hash[entry['sha256']] = entry['tokens']
+
+        self.manifest_file = open(self.manifest_path, 'a', encoding='utf-8')
+        self.tokens_file = open(self.tokens_path, 'ab')
+        self.tokens_reader = open(self.tokens_path, 'rb')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Close the manifest files"""
+        self.manifest_file.close()
+        self.tokens_file.close()
+        self.tokens_reader.close()
+
+    def check(self, path):
+        """Check if a file has already been read
+
+        :parameter
+            path : path to a file (string)
+
+        Only the size and modification time are checked, so this is fast enough to run for every file in the process
+        that sends the files to the workers. The hash is calculated by the worker if the file may have changed.
+
+        :return
+            FileCheck, where tokens_ref is None if the file has to be hashed and possibly read
+        """
+        rel_path = os.path.relpath(path, self.coll_directory)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            # Lets the function for reading the file decide what to do with a path error.
+            return FileCheck(path, rel_path, None, None, None, None, False)
+
+        # Same size and modification time as when the file was read before, so the contents are not checked.
+        entry = self.entries.get(rel_path)
+        if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime_ns:
+            return FileCheck(path, rel_path, stat.st_size, stat.st_mtime_ns, entry['sha256'], entry['tokens'], True)
+
+        # New or maybe changed. The worker compares the hash to the one from before, if the path was read before.
+        return FileCheck(path, rel_path, stat.st_size, stat.st_mtime_ns, entry['sha256'] if entry else None, None,
+                         False)
+
+    def load_tokens(self, tokens_ref):
+        """Get the words saved for a file, using the location from the manifest"""
+        self.tokens_reader.seek(tokens_ref)
+        return json.loads(self.tokens_reader.readline())
+
+    def record(self, file_check, file_text=None):
+        """Save a file to the manifest, adding its words to tokens.jsonl if it was read in this run
+
+        :parameter
+            file_check : result of check for the file (FileCheck)
+            file_text : the words from the file (list of strings) or None if it could not be read
+
+        :return
+            None
+        """
+        if file_check.size is None or file_check.is_recorded:
+            return
+
+        # Not saved, so the file is tried again next run, in case it failed or was cut short only this time.
+        if file_text is None or isinstance(file_text, IncompleteText):
+            return
+
+        # Words are only saved once for files with the same contents.
+        tokens_ref = file_check.tokens_ref
+        if tokens_ref is None:
+            tokens_ref = self.tokens_by_hash.get(file_check.sha256)
+        if tokens_ref is None:
+            tokens_ref = self.tokens_file.tell()
+            self.tokens_file.write(json.dumps(file_text).encode('utf-8') + b'\n')
+            self.tokens_file.flush()
+
+        entry = {'path': file_check.rel_path, 'reader': self.reader, 'size': file_check.size, 'mtime': file_check.mtime,
+                 'sha256': file_check.sha256, 'tokens': tokens_ref}
+        self.manifest_file.write(json.dumps(entry) + '\n')
+        self.manifest_file.flush()
+        self.entries[entry['path']] = entry
+        self.tokens_by_hash[entry['sha256']] = tokens_ref
+
+    def read_through(self, paths, read_file, map_paths=map):
+        """Get the words for every file, only reading the files that are not already in the manifest
+
+        Every file is checked and sent to map_paths as one lazy stream, so with a process pool the workers are always
+        busy and one slow file only holds up its own worker. Files that are already in the manifest go through
+        map_paths too, which returns them right away, so the results stay in the order of paths.
+
+        :parameter
+            paths : the paths to the files (iterable of strings)
+            read_file : function that takes the path to a file and returns a list of words or None.
+                        To use a process pool, it must be defined at the top level of a module so it can be pickled.
+            map_paths : function like map that takes a function and an iterable and returns the results in order,
+                        for example imap of a process pool to read the files in worker processes
+
+        :return
+            Generator of the words (list of strings) or None for each path, in the order of paths
+        """
+        checks = (self.check(path) for path in paths)
+        for file_check, file_text, is_read in map_paths(_HashAndRead(read_file), checks):
+            if not is_read:
+                tokens_ref = file_check.tokens_ref
+                if tokens_ref is None:
+                    tokens_ref = self.tokens_by_hash[file_check.sha256]
+                file_check = file_check._replace(tokens_ref=tokens_ref)
+                file_text = self.load_tokens(tokens_ref)
+            self.record(file_check, file_text)
+            yield file_text
+
+
+class _HashAndRead:
+    """Hash and read one file for ExtractionManifest.read_through, in a worker process or thread
+
+    Files already in the manifest, and files with the same hash as when they were read before, are not read.
+    Returns a tuple with the FileCheck (with the hash), the words or None, and whether the file was read.
+    """
+
+    def __init__(self, read_file):
+        self.read_file = read_file
+
+    def __call__(self, file_check):
+        if file_check.tokens_ref is not None:
+            return file_check, None, False
+        if file_check.size is None:
+            # Lets the function for reading the file decide what to do with a path error.
+            return file_check, self.read_file(file_check.path), True
+        sha256 = file_hash(file_check.path)
+        if sha256 == file_check.sha256:
+            return file_check, None, False
+        return file_check._replace(sha256=sha256), self.read_file(file_check.path), True
+
+
+def file_hash(path, block_size=1024 * 1024):
+    """Calculate the SHA-256 hash of the contents of a file, reading it in blocks"""
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
@@ -0,0 +1,239 @@
+"""Choose how to read a file from its contents (magic bytes), using the file extension only when that is not enough
+
+Each format is registered with the extensions it usually has, signatures (magic bytes) found in its first bytes,
+and optionally a verify function for formats that share a container, like docx and xps which are both zip files.
+A backend registers a reader for each format it can read (read_files_manual.py),
+or a default reader that is given every file and a function to detect the format if it needs it
+(read_files_tika.py and read_files_textract.py).
+
+Detecting the format only reads the first HEADER_SIZE bytes of the file, plus the zip or OLE2 directory when
+a signature matches a container format. The result is cached per file (path, size and modification time),
+so it is only detected once even if a file is read more than once in a process.
+When no reader is registered for any format, like with Tika, the format is only detected if the default reader asks.
+
+Files are detected in this order:
+    1. The format with the extension, if its signature (if it has any) matches and verify (if any) passes,
+       so a txt file that mentions %PDF- in its text is still read as txt
+    2. Other formats with a signature that matches the header (and verify, if any), for files with the wrong extension
+    3. Formats without signatures whose verify passes, only for files that have no extension
+
+If a reader raises an error for one file, read prints it and returns None, so the rest of the collection is still read.
+"""
+from collections import namedtuple
+from functools import lru_cache
+import olefile
+import os
+import zipfile
+
+# The number of bytes from the start of the file used to detect the format.
+HEADER_SIZE = 2048
+
+# The number of bytes from the start of the file to search for a signature with no offset.
+# The PDF specification allows %PDF- anywhere in the first 1024 bytes, after junk like an email header.
+SIGNATURE_SEARCH_SIZE = 1024
+
+# A format that can be detected.
+# signatures is a list of tuples with the offset and the bytes,
+# where an offset of None means anywhere in the first SIGNATURE_SEARCH_SIZE bytes.
+# verify is a function that takes the path and header and returns True if the file is this format, or None.
+FileFormat = namedtuple('FileFormat', ['name', 'extensions', 'signatures', 'verify'])
+
+# Signatures for the containers used by several formats.
+OLE2_SIGNATURE = (0, b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1')
+ZIP_SIGNATURE = (0, b'PK\x03\x04')
+
+
+def get_extension(path):
+    """Calculate the lowercase version of the file extension
+
+    :parameter
+        path : path to a file (string)
+
+    :return
+        Lowercase version of the file extension (string), or an empty string if the file name has no period
+    """
+    file_name = os.path.basename(path)
+    if '.' not in file_name:
+        return ''
+    return file_name.split('.')[-1].lower()
+
+
+def is_text(path, header):
+    """Check if the header looks like plain text: no null bytes and it can be decoded as UTF-8 or Windows-1252,
+    which is common for text files from Windows computers"""
+    if b'\x00' in header:
+        return False
+    try:
+        header.decode('utf-8')
+    except UnicodeDecodeError as error:
+        # The header may end partway through a multi-byte character.
+        if error.start >= len(header) - 3:
+            return True
+        try:
+            header.decode('cp1252')
+        except UnicodeDecodeError:
+            return False
+    return True
+
+
+def is_word_document(path, header):
+    """Check if an OLE2 file is a Word 97-2003 document, and not another Office format like Excel"""
+    try:
+        with olefile.OleFileIO(path) as ole:
+            return ole.exists('WordDocument')
+    except (OSError, ValueError):
+        return False
+
+
+def zip_has(member_name=None, member_suffix=None):
+    """Make a verify function that checks if a zip file has a member with the name or a name ending in the suffix"""
+    def verify(path, header):
+        try:
+            with zipfile.ZipFile(path) as zip_file:
+                names = zip_file.namelist()
+        except (zipfile.BadZipFile, OSError):
+            return False
+        if member_name:
+            return member_name in names
+        return any(name.endswith(member_suffix) for name in names)
+    return verify
+
+
+# Formats detected by every registry. Backends only need to register a reader for these.
+STANDARD_FORMATS = [
+    FileFormat('doc', ('doc',), (OLE2_SIGNATURE,), is_word_document),
+    FileFormat('docx', ('docx',), (ZIP_SIGNATURE,), zip_has(member_name='word/document.xml')),
+    FileFormat('pdf', ('pdf',), ((None, b'%PDF-'),), None),
+    FileFormat('txt', ('txt',), (), is_text),
+    FileFormat('xps', ('xps', 'oxps'), (ZIP_SIGNATURE,), zip_has(member_suffix='.fdseq')),
+]
+
+
+class ExtractorRegistry:
+    """The formats that can be detected and the function to read each one
+
+    :parameter
+        cache_size : the number of files to remember the detected format for (integer)
+    """
+
+    def __init__(self, cache_size=100000):
+        self.formats = {file_format.name: file_format for file_format in STANDARD_FORMATS}
+        self.readers = {}
+        self.default_reader = None
+        self._detect_cached = lru_cache(maxsize=cache_size)(self._detect)
+
+    def register(self, name, reader, extensions=None, signatures=None, verify=None):
+        """Add the reader for a format, and add or change how the format is detected
+
+        :parameter
+            name : name of the format (string)
+            reader : function that takes the path to a file and returns a list of words or None, or None for no reader
+            extensions : lowercase extensions for the format (tuple of strings), or None to keep the standard ones
+            signatures : tuples with the offset and bytes at the start of the file, or None to keep the standard ones
+            verify : function that takes the path and header and returns True if it is this format, or None
+
+        :return
+            None
+        """
+        standard = self.formats.get(name, FileFormat(name, (), (), None))
+        self.formats[name] = FileFormat(name,
+                                        standard.extensions if extensions is None else tuple(extensions),
+                                        standard.signatures if signatures is None else tuple(signatures),
+                                        verify or standard.verify)
+        if reader:
+            self.readers[name] = reader
+        self._detect_cached.cache_clear()
+
+    def set_default_reader(self, reader):
+        """Add a reader for every file without its own reader
+
+        The reader takes the path and a function with no arguments that returns the detected format (or None).
+        The format is only detected when that function is called, so a reader that does not need it saves the I/O.
+        """
+        self.default_reader = reader
+
+    def detect(self, path):
+        """Find the format of a file from its contents and extension
+
+        :parameter
+            path : path to a file (string)
+
+        :return
+            The name of the format (string) or None if it is not one of the registered formats
+        """
+        stat = os.stat(path)
+        return self._detect_cached(path, stat.st_size, stat.st_mtime_ns)
+
+    def read(self, path):
+        """Read a file with the reader for its format
+
+        :parameter
+            path : path to a file (string)
+
+        :return
+            The result of the reader, or None if there is no reader for the format, the path is not found,
+            or the reader raised an error
+        """
+        # The format is only needed here to find its reader. Otherwise the default reader detects it if it needs it.
+        format_name = None
+        if self.readers:
+            try:
+                format_name = self.detect(path)
+            except FileNotFoundError:
+                print('Path error for', path)
+                return None
+
+        # One file that cannot be read, like a damaged PDF, does not stop the rest of the collection.
+        try:
+            if format_name in self.readers:
+                return self.readers[format_name](path)
+            if self.default_reader:
+                return self.default_reader(path, lambda: format_name if self.readers else self.detect(path))
+        except FileNotFoundError:
+            print('Path error for', path)
+        except Exception as error:
+            print(f'Could not read {format_name} ({type(error).__name__}: {error})', path)
+        return None
+
+    def _detect(self, path, size, mtime):
+        """Find the format of a file. Size and modification time are only included so the cache notices changes."""
+        with open(path, 'rb') as f:
+            header = f.read(HEADER_SIZE)
+        extension = get_extension(path)
+
+        # 1. The format with the extension, if the contents match it.
+        if extension:
+            for file_format in self.formats.values():
+                if extension in file_format.extensions and _format_matches(file_format, path, header):
+                    return file_format.name
+
+        # 2. Other formats with a signature that matches, for files with the wrong extension.
+        for file_format in self.formats.values():
+            if file_format.signatures and extension not in file_format.extensions \
+                    and _format_matches(file_format, path, header):
+                return file_format.name
+
+        # 3. Formats without signatures, by content, only if there is no extension.
+        if not extension:
+            for file_format in self.formats.values():
+                if not file_format.signatures and file_format.verify and file_format.verify(path, header):
+                    return file_format.name
+        return None
+
+
+def _format_matches(file_format, path, header):
+    """Check if the signature (if the format has any) is in the header and verify (if any) passes"""
+    if file_format.signatures and not _signature_matches(file_format.signatures, header):
+        return False
+    return file_format.verify is None or bool(file_format.verify(path, header))
+
+
+def _signature_matches(signatures, header):
+    """Check if any of the signatures are in the header"""
+    for offset, magic in signatures:
+        if offset is None:
+            if magic in header[:SIGNATURE_SEARCH_SIZE]:
+                return True
+        elif header[offset:offset + len(magic)] == magic:
+            return True
+    return False
@@ -1,80 +1,85 @@
 """Experiment with reading the contents of files into Python for topical analysis
 
-Uses file extensions to decide which library to use to read the files.
+Uses the file contents (magic bytes), and the file extension when that is not enough,
+to decide which library to use to read the files. See extractor_registry.py.
 For testing, reading plain text, Microsoft Word (doc and docx), and PDF.
 Also including another file (.xps) that cannot be read by the script.
 
-Parameter:
+Parameters:
     coll_directory (required): path to folder for a collection, which contains AIP folders
+    workers (optional): number of processes to read files with, default is 1 (read one file at a time)
 
 Returns:
     A list, with each item being another list of the words (cleaned up) for a single document.
 """
-from doc2docx import convert
+from contextlib import contextmanager
 import os
 import docx2txt
-import pandas as pd
 from PyPDF2 import PdfReader
-import re
+import signal
 import sys
-
-
-def get_extension(path):
-    """Calculate the lowercase version of the file extension
-
-    :parameter
-        path : path to a file (string)
-
-    :return
-        Lowercase version of the file extension (string)
-        If there is no extension and no period in the path, it returns the entire path
-    """
-    path_list = path.split('.')
-    ext = path_list[-1]
-    ext_lower = ext.lower()
-    return ext_lower
-
-
-def read(path, ext):
-    """Read the contents of a file by calling another function based on its file extension
+import threading
+
+from collection_crawler import iter_collection
+from doc_text import read_doc_text
+from extraction_manifest import ExtractionManifest, IncompleteText, reader_key
+from extractor_registry import ExtractorRegistry
+from text_writer import read_text, StreamingTextWriter, text_path
+
+# The shared stop word list and text clean up are in the parse-file-list folder of this repo.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'parse-file-list'))
+from stop_words import get_stop_words, REMOVE_CHARACTERS, text_to_clean_list
+
+# Limits for reading a PDF, so one very large PDF cannot stall a worker. Use None for no limit.
+# PDF_MAX_PAGES is the number of pages to read from the start of each PDF.
+# PDF_PAGE_TIMEOUT is the number of seconds to spend on one page before skipping it.
+PDF_MAX_PAGES = None
+PDF_PAGE_TIMEOUT = 60
+
+# Expected words for each document in test_input_directory, used by the proof of concept test.
+EXPECTED_COLL_TEXT = [['word', 'test', 'file', 'word', 'word', 'word', 'word', 'word'],
+                      ['another', 'word', 'test', 'file', 'test', 'file', 'test', 'file'],
+                      ['multiple', 'page', 'pd', 'f', 'page', '1',
+                       'line', 'text', 'line', 'text', 'line', 'text', 'line', 'text', 'line', 'text', 'line', 'text',
+                       'line', 'text', 'line', 'text', 'line', 'text', 'line', 'text', 'line', 'text', 'line', 'text',
+                       'line', 'text', 'line', 'text', 'line', 'text', 'line', 'text', 'line', 'text', 'line', 'text',
+                       'line', 'text', 'line', 'text', 'line', 'text', 'line', 'text', 'line', 'text',
+                       'multiple', 'page', 'page', '2', 'line', 'text', 'line', 'text', 'line', 'text'],
+                      ['first', 't', 'est', 'one', 'one', 'one', 'one', 'one', 'one'],
+                      ['second', 'test', 'file', 'two', 'two', 'two', 'two', 'two', 'two'],
+                      ['test', 'file', 'text', 'test', 'test', 'test']]
+
+
+def read(path):
+    """Read the contents of a file by calling the function registered for its format, for use with iter_collection
 
      :parameter
          path : path to a file (string)
-         ext : lowercase extension of the file (string)
 
      :return
-         A list with the words, after cleanup, in the file or None if there is no library to read that extension
+         A list with the words, after cleanup, in the file or None if there is no library to read that format
     """
-    if ext == 'doc':
-        text_list = read_doc(path)
-    elif ext == 'docx':
-        text_list = read_docx(path)
-    elif ext == 'pdf':
-        text_list = read_pdf(path)
-    elif ext == 'txt':
-        text_list = read_txt(path)
-    else:
-        text_list = None
-
-    return text_list
+    return registry.read(path)
 
 
 def read_doc(path):
     """Read the contents of a file with a .doc extension and convert to a list by calling another function
 
-    Temporarily making a .docx version because the methods for reading .doc are less well supported.
+    Reads the text directly from the Word 97-2003 format in memory, instead of making a temporary .docx version,
+    so nothing is written to the folder with the file and Microsoft Word is not needed.
 
     :parameter
         path : path to a file (string)
 
     :return
-        A list with the words, after cleanup, in the file
+        A list with the words, after cleanup, in the file or None if it is not a Word 97-2003 document
     """
-    convert(path)
-    new_path = path + 'x'
-    text = docx2txt.process(new_path)
+    try:
+        text = read_doc_text(path)
+    except ValueError as error:
+        print(f'Format cannot be read ({error})', path)
+        return None
     text_list = text_to_clean_list(text)
-    os.remove(new_path)
     return text_list
 
 
@@ -92,22 +97,77 @@ def read_docx(path):
     return text_list
 
 
-def read_pdf(path):
-    """Read the contents of a file with a .pdf file extension and convert to a list by calling another function
+def iter_pdf_pages(path, max_pages=None, page_timeout=None):
+    """Read the text of a PDF one page at a time
 
     :parameter
         path : path to a file (string)
+        max_pages : the number of pages to read from the start of the PDF (integer), or None to read every page
+        page_timeout : seconds to spend reading one page before skipping it (float), or None for no limit
 
     :return
-        A list with the words, after cleanup, in the file
+        Generator of the text of each page (string), or None for a page that was skipped because it took too long
     """
-    text = ''
     reader = PdfReader(path)
-    for page in reader.pages:
-        page_text = page.extract_text()
-        text += (' ' + page_text)
-    text_list = text_to_clean_list(text)
-    return text_list
+    for page_number, page in enumerate(reader.pages):
+        if max_pages is not None and page_number >= max_pages:
+            print(f'Read only the first {max_pages} pages of', path)
+            return
+        try:
+            with time_limit(page_timeout):
+                page_text = page.extract_text()
+        except TimeoutError:
+            print(f'Skipped page {page_number + 1}, took more than {page_timeout} seconds, for', path)
+            page_text = None
+        yield page_text
+
+
+def read_pdf(path, max_pages=PDF_MAX_PAGES, page_timeout=PDF_PAGE_TIMEOUT):
+    """Read the contents of a file with a .pdf file extension and convert to a list by calling another function
+
+    Each page is cleaned up as it is read, instead of combining the text of every page into one string first.
+    This gives the same words, since pages were combined with a space and words are split at spaces.
+
+    :parameter
+        path : path to a file (string)
+        max_pages : the number of pages to read from the start of the PDF (integer), or None to read every page
+        page_timeout : seconds to spend reading one page before skipping it (float), or None for no limit
+
+    :return
+        A list with the words, after cleanup, in the file,
+        which is an IncompleteText if a page was skipped so the manifest does not save it
+    """
+    text_list = []
+    skipped_page = False
+    for page_text in iter_pdf_pages(path, max_pages, page_timeout):
+        if page_text is None:
+            skipped_page = True
+            continue
+        text_list.extend(text_to_clean_list(page_text))
+    return IncompleteText(text_list) if skipped_page else text_list
+
+
+@contextmanager
+def time_limit(seconds):
+    """Raise TimeoutError if the code in the with block takes more than the number of seconds
+
+    Uses a timer signal, so it only works in the main thread on operating systems with SIGALRM (not Windows).
+    Otherwise, or if seconds is None, there is no limit. Each process in a pool has its own main thread.
+    """
+    if not seconds or not hasattr(signal, 'SIGALRM') or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    def raise_timeout(signum, frame):
+        raise TimeoutError
+
+    previous_handler = signal.signal(signal.SIGALRM, raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
 
 
 def read_txt(path):
@@ -119,12 +179,26 @@ def read_txt(path):
     :return
         A list with the words, after cleanup in the file
     """
-    with open(path) as f:
-        text = f.read()
+    # Text files from Windows computers are often Windows-1252 instead of UTF-8, which is_text also accepts.
+    try:
+        with open(path, encoding='utf-8') as f:
+            text = f.read()
+    except UnicodeDecodeError:
+        with open(path, encoding='cp1252', errors='replace') as f:
+            text = f.read()
     text_list = text_to_clean_list(text)
     return text_list
 
 
+# The function to read each format. To read another format, register a function for it here,
+# with its extensions and signatures if it is not one of the standard formats in extractor_registry.py.
+registry = ExtractorRegistry()
+registry.register('doc', read_doc)
+registry.register('docx', read_docx)
+registry.register('pdf', read_pdf)
+registry.register('txt', read_txt)
+
+
 def success_rate(folder, success, total):
     """Calculate the number, and percent, of files that could be read and prints the result
 
@@ -142,6 +216,8 @@ def success_rate(folder, success, total):
 
 def test_aip_result(aip_folder):
     """For the proof of concept, test that test_input_directory gives the expected aip-level result."""
+    aip_text = read_text(text_path(os.path.join(coll_directory, 'extracted_text'), aip_folder))
+
     # Test for Folder One.
     if aip == 'Folder One':
         expected = [['word', 'test', 'file', 'word', 'word', 'word', 'word', 'word'],
@@ -175,17 +251,8 @@ def test_aip_result(aip_folder):
 
 def test_coll_result():
     """For the proof of concept, test that test_input_directory gives the expected collection-level result."""
-    expected = [['word', 'test', 'file', 'word', 'word', 'word', 'word', 'word'],
-                ['another', 'word', 'test', 'file', 'test', 'file', 'test', 'file'],
-                ['multiple', 'page', 'pd', 'f', 'page', '1',
-                 'line', 'text', 'line', 'text', 'line', 'text', 'line', 'text', 'line', 'text', 'line', 'text',
-                 'line', 'text', 'line', 'text', 'line', 'text', 'line', 'text', 'line', 'text', 'line', 'text',
-                 'line', 'text', 'line', 'text', 'line', 'text', 'line', 'text', 'line', 'text', 'line', 'text',
-                 'line', 'text', 'line', 'text', 'line', 'text', 'line', 'text', 'line', 'text',
-                 'multiple', 'page', 'page', '2', 'line', 'text', 'line', 'text', 'line', 'text'],
-                ['first', 't', 'est', 'one', 'one', 'one', 'one', 'one', 'one'],
-                ['second', 'test', 'file', 'two', 'two', 'two', 'two', 'two', 'two'],
-                ['test', 'file', 'text', 'test', 'test', 'test']]
+    coll_text = read_text(text_path(os.path.join(coll_directory, 'extracted_text'), os.path.basename(coll_directory)))
+    expected = EXPECTED_COLL_TEXT
     result_match = coll_text == expected
 
     if result_match is True:
@@ -199,108 +266,54 @@ def test_coll_result():
                 print("Result:  ", text)
 
 
-def text_to_clean_list(text_string):
-    """Convert a string to a list of words, with some clean up
-
-    Parameter:
-        text_string : text contents of a file (string)
-
-    Returns:
-        List of words, lowercase and without stop words
-    """
-    # Makes all characters lowercase.
-    text_string = text_string.lower()
-
-    # Removes punctuation and other non-word characters to reduce the variation of words.
-    # These cannot be removed as stop words because they are not entire words.
-    remove_characters = ['.', '!', '?', ',', ';']
-    for character in remove_characters:
-        text_string = text_string.replace(character, '')
-
-    # Makes a list of words by splitting the string at spaces and newlines, and then removing empty strings.
-    text_list = re.split('[\n ]', text_string)
-    text_list = [x for x in text_list if x]
-
-    # Reads a CSV of default words to remove that do not indicate subjects, like "the", into a list.
-    df = pd.read_csv(os.path.join(os.getcwd(), '..', 'parse-file-list', 'stop_list.csv'))
-    stop_words = df['Term'].to_list()
-
-    # Makes a list of every word in text_list that is not in stop_words.
-    clean_text_list = []
-    for word in text_list:
-        if word not in stop_words:
-            clean_text_list.append(word)
-
-    return clean_text_list
-
-
 if __name__ == '__main__':
 
-    # Assigns script argument to a variable
+    # Assigns script arguments to variables.
     coll_directory = sys.argv[1]
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 1
 
     # Makes a folder for script output in the coll_directory, if it doesn't already exist.
     # It is only likely to exist when running this script repeatedly for testing.
     if not os.path.exists(os.path.join(coll_directory, 'extracted_text')):
         os.mkdir(os.path.join(coll_directory, 'extracted_text'))
 
-    # Starts variables for reading every file in the collection directory.
-    coll_text = []
+    # Starts variables for counting the files in the collection directory.
+    coll_name = os.path.basename(coll_directory)
+    coll_read = 0
     coll_files = 0
 
-    # For each AIP (first level folder within coll_directory),
-    # finds and tries to read each file in that AIP.
-    for aip in os.listdir(coll_directory):
+    # Saves each document's words to the AIP and collection text files in coll_directory as soon as it is read,
+    # instead of keeping the text for the whole collection in memory until the end.
+    # Files that were already read in an earlier run are not read again if they have not changed since then,
+    # using the manifest in the extracted_text folder. Delete manifest.jsonl and tokens.jsonl to read everything again.
+    # Only words saved by this script with the same clean up and PDF limits are used.
+    manifest_reader = reader_key('manual', get_stop_words(), remove_characters=REMOVE_CHARACTERS,
+                                 pdf_max_pages=PDF_MAX_PAGES, pdf_page_timeout=PDF_PAGE_TIMEOUT)
+    with StreamingTextWriter(os.path.join(coll_directory, 'extracted_text'), coll_name) as writer, \
+            ExtractionManifest(os.path.join(coll_directory, 'extracted_text'), coll_directory,
+                               manifest_reader) as manifest:
+
+        # For each AIP (first level folder within coll_directory), reads each file in that AIP
+        # in the same order for any number of workers.
+        for aip, aip_files, file_texts in iter_collection(coll_directory, read, workers, manifest=manifest):
+            writer.start_aip(aip)
+            aip_read = 0
+            for file_text in file_texts:
+                if file_text:
+                    writer.write(file_text)
+                    aip_read += 1
+            writer.end_aip()
+            coll_read += aip_read
+            coll_files += aip_files
 
-        # Skip the output folders. During testing, each technique had a different output folder.
-        if aip.startswith('extracted_text'):
-            continue
+            # Calculates and prints the success rate of reading the files for the AIP.
+            success_rate(aip, aip_read, aip_files)
 
-        # Starts variables for reading every file in the AIP directory.
-        aip_text = []
-        aip_files = 0
-
-        for root, dirs, files in os.walk(os.path.join(coll_directory, aip)):
-            coll_files += len(files)
-            aip_files += len(files)
-
-            # Tries to read each file based on the extension.
-            for file in files:
-                file_path = os.path.join(coll_directory, aip, root, file)
-                extension = get_extension(file_path)
-                try:
-                    file_text = read(file_path, extension)
-                except FileNotFoundError:
-                    print('Path error for', file_path)
-                    file_text = None
-                if file_text:
-                    coll_text.append(file_text)
-                    aip_text.append(file_text)
-
-        # Saves the AIP text to a file in the coll_directory.
-        with open(os.path.join(coll_directory, 'extracted_text', f'{aip}_text.txt'), 'w') as f:
-            for line_list in aip_text:
-                try:
-                    f.write(f'{"|".join(line_list)}\n')
-                except UnicodeEncodeError:
-                    print('Skipped line, unicode issues')
-
-        # Calculates and prints the success rate of reading the files for the AIP.
-        success_rate(aip, len(aip_text), aip_files)
-
-        # Test that test_input_directory gave the expected output for each AIP.
-        # test_aip_result(aip)
-
-    # Saves the collection text to a file in coll_directory.
-    with open(os.path.join(coll_directory, 'extracted_text', f'{os.path.basename(coll_directory)}_text.txt'), 'w') as f:
-        for line_list in coll_text:
-            try:
-                f.write(f'{"|".join(line_list)}\n')
-            except UnicodeEncodeError:
-                print('Skipped line, unicode issues')
+            # Test that test_input_directory gave the expected output for each AIP.
+            # test_aip_result(aip)
 
     # Calculates and prints the success rate of reading the files for the entire collection.
-    success_rate(os.path.basename(coll_directory), len(coll_text), coll_files)
+    success_rate(coll_name, coll_read, coll_files)
 
     # Test that test_input_directory gave the expected output.
     # test_coll_result()
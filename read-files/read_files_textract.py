@@ -6,22 +6,37 @@ Parameters:
     input_directory (required): path to folder with files
 """
 import os
-import pandas as pd
 import sys
 import re
 import textract
 
+from collection_crawler import iter_collection
+from extractor_registry import ExtractorRegistry
+from text_writer import StreamingTextWriter
 
-def read_file(path):
-    """Reads the file and returns the text, and if there was an error"""
+# The shared stop word list and text clean up are in the parse-file-list folder of this repo.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'parse-file-list'))
+from stop_words import REMOVE_CHARACTERS, REMOVE_WHITESPACE, text_to_clean_list
+
+
+def read_file(path, get_format=None):
+    """Reads the file and returns the text, and if there was an error
+
+    The format detected by the registry (with get_format) is given to textract as the extension,
+    so files with the wrong extension or no extension are read with the right method.
+    """
 
     text = None
+    format_name = get_format() if get_format else None
 
     # If it works as expected, on a format that it can read.
     try:
-        text = textract.process(path)
+        if format_name:
+            text = textract.process(path, extension=format_name)
+        else:
+            text = textract.process(path)
         text = text.decode("utf-8")
-        text = text_to_clean_list(text)
+        text = text_to_clean_list(text, REMOVE_CHARACTERS + REMOVE_WHITESPACE)
     # If it works as expected, on a format that it cannot read.
     except (ModuleNotFoundError, re.error):
         print('Format cannot be read', path)
@@ -35,14 +50,9 @@ def read_file(path):
     return text
 
 
-def save_text(id, text_list):
-    """Save the text to a text file for later analysis, with one line for each document's words"""
-    with open(os.path.join(coll_directory, 'extracted_text', f'{id}_text.txt'), 'w') as f:
-        for line_list in text_list:
-            try:
-                f.write(f'{"|".join(line_list)}\n')
-            except UnicodeEncodeError:
-                print('Skipped line, unicode issues')
+# textract reads every file, using the detected format when there is one.
+registry = ExtractorRegistry()
+registry.set_default_reader(read_file)
 
 
 def success_rate(folder, success, total):
@@ -61,41 +71,6 @@ def success_rate(folder, success, total):
     print(f"{success} files out of {total} read ({percent_success}%)")
 
 
-def text_to_clean_list(text_string):
-    """Convert a string to a list of words, with some clean up
-
-    Parameter:
-        text_string : text contents of a file (string)
-
-    Returns:
-        List of words, lowercase and without stop words
-    """
-    # Makes all characters lowercase.
-    text_string = text_string.lower()
-
-    # Removes punctuation and other non-word characters to reduce the variation of words.
-    # These cannot be removed as stop words because they are not entire words.
-    remove_characters = ['.', '!', '?', ',', ';', '\r', '\t']
-    for character in remove_characters:
-        text_string = text_string.replace(character, '')
-
-    # Makes a list of words by splitting the string at spaces and newlines, and then removing empty strings.
-    text_list = re.split('[\n ]', text_string)
-    text_list = [x for x in text_list if x]
-
-    # Reads a CSV of default words to remove that do not indicate subjects, like "the", into a list.
-    df = pd.read_csv(os.path.join(os.getcwd(), '..', 'parse-file-list', 'stop_list.csv'))
-    stop_words = df['Term'].to_list()
-
-    # Makes a list of every word in text_list that is not in stop_words.
-    clean_text_list = []
-    for word in text_list:
-        if word not in stop_words:
-            clean_text_list.append(word)
-
-    return clean_text_list
-
-
 if __name__ == '__main__':
 
     # Assigns script argument to a variable
@@ -106,43 +81,29 @@ if __name__ == '__main__':
     if not os.path.exists(os.path.join(coll_directory, 'extracted_text')):
         os.mkdir(os.path.join(coll_directory, 'extracted_text'))
 
-    # Starts variables for reading every file in the collection directory.
-    coll_text = []
+    # Starts variables for counting the files in the collection directory.
+    coll_name = os.path.basename(coll_directory)
+    coll_read = 0
     coll_files = 0
 
-    # For each AIP (first level folder within coll_directory),
-    # finds and tries to read each file in that AIP.
-    for aip in os.listdir(coll_directory):
-
-        # Skip the output folder. During testing, each technique had a different output folder.
-        if aip.startswith('extracted_text'):
-            continue
+    # Saves each document's words to the AIP and collection text files in coll_directory as soon as it is read,
+    # instead of keeping the text for the whole collection in memory until the end.
+    with StreamingTextWriter(os.path.join(coll_directory, 'extracted_text'), coll_name) as writer:
 
-        # Starts variables for reading every file in the AIP directory.
-        aip_text = []
-        aip_files = 0
-
-        # Gets the path to each file in the input directory.
-        for root, dirs, files in os.walk(os.path.join(coll_directory, aip)):
-            coll_files += len(files)
-            aip_files += len(files)
-
-            for file in files:
-                file_path = os.path.join(coll_directory, aip, root, file)
-                # Reads the file and updates the read count.
-                file_text = read_file(file_path)
+        # For each AIP (first level folder within coll_directory), finds and tries to read each file in that AIP.
+        for aip, aip_files, file_texts in iter_collection(coll_directory, registry.read):
+            writer.start_aip(aip)
+            aip_read = 0
+            for file_text in file_texts:
                 if file_text:
-                    coll_text.append(file_text)
-                    aip_text.append(file_text)
-
-        # Saves the AIP text to a file in coll_directory.
-        save_text(aip, aip_text)
-
-        # Calculates and prints the success rate of reading the files for the AIP.
-        success_rate(aip, len(aip_text), aip_files)
+                    writer.write(file_text)
+                    aip_read += 1
+            writer.end_aip()
+            coll_read += aip_read
+            coll_files += aip_files
 
-    # Saves the collection text to a file in coll_directory.
-    save_text(os.path.basename(coll_directory), coll_text)
+            # Calculates and prints the success rate of reading the files for the AIP.
+            success_rate(aip, aip_read, aip_files)
 
     # Calculates and prints the success rate of reading the files for the entire collection.
-    success_rate(os.path.basename(coll_directory), len(coll_text), coll_files)
+    success_rate(coll_name, coll_read, coll_files)
\ No newline at end of file
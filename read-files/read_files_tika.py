@@ -3,48 +3,75 @@
 For testing, want to read plain text, Microsoft Word (doc and docx), and PDF.
 Also including another file (.xps) that don't expect to be read by the script, but Tika could read it.
 
-Parameter:
+Sends the files to a Tika server with tika_client.py, which reuses one connection session
+and sends several files at once instead of waiting after each file.
+The server is started by the tika library if it is not already running at the default endpoint.
+
+Parameters:
     input_directory (required): path to folder with files
+    max_concurrent (optional): the most files to send to the Tika server at once, default is 4
 
 Returns:
     A list, with eaach item being another list of the words (cleaned up) for a single document.
 """
 import os
-import pandas as pd
-import re
 import sys
-import time
-from tika import parser
-
-
-def read(path):
+from tika import tika
+
+from collection_crawler import iter_collection
+from extraction_manifest import ExtractionManifest, reader_key
+from extractor_registry import ExtractorRegistry
+from text_writer import read_text, StreamingTextWriter, text_path
+from tika_client import DEFAULT_ENDPOINT, TikaClient
+
+# The shared stop word list and text clean up are in the parse-file-list folder of this repo.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'parse-file-list'))
+from stop_words import get_stop_words, REMOVE_CHARACTERS, REMOVE_WHITESPACE, text_to_clean_list
+
+# Expected words for each document in test_input_directory, used by the proof of concept test.
+EXPECTED_COLL_TEXT = [['file', 'skipped', '/docprops/thumbnailjpeg'],
+                      ['word', 'test', 'file', 'word', 'word', 'word', 'word', 'word'],
+                      ['another', 'word', 'test', 'file', 'test', 'file', 'test', 'file'],
+                      ['multiple', 'page', 'page', '1',
+                       'line', 'text', 'line', 'text', 'line', 'text', 'line', 'text', 'line', 'text', 'line', 'text',
+                       'line', 'text', 'line', 'text', 'line', 'text', 'line', 'text', 'line', 'text', 'line', 'text',
+                       'line', 'text', 'line', 'text', 'line', 'text', 'line', 'text', 'line', 'text', 'line', 'text',
+                       'line', 'text', 'line', 'text', 'line', 'text', 'line', 'text', 'line', 'text',
+                       'multiple', 'page', 'page', '2', 'line', 'text', 'line', 'text', 'line', 'text'],
+                      ['first', 'test', 'one', 'one', 'one', 'one', 'one', 'one'],
+                      ['second', 'test', 'file', 'two', 'two', 'two', 'two', 'two', 'two'],
+                      ['test', 'file', 'text', 'test', 'test', 'test']]
+
+
+def read(path, get_format=None):
     """Read the contents of a file
 
     :parameter
         path : path to a file (string)
+        get_format : function from the registry that detects the format, not used because Tika detects it too,
+                     so the registry does not read the file to detect it
 
     :return
         A list with the words, after cleanup, in the file
     """
-    parsed = parser.from_file(path)
-    text = parsed['content']
-    time.sleep(10)
+    if tika_client is None:
+        raise RuntimeError('Set read_files_tika.tika_client to a TikaClient before reading files')
+    text = tika_client.extract_text(path)
     # If the format cannot be read, text is none.
     if text:
-        text_list = text_to_clean_list(text)
+        text_list = text_to_clean_list(text, REMOVE_CHARACTERS + REMOVE_WHITESPACE)
         return text_list
     else:
         return None
 
 
-def save_text(id, text_list):
-    """Save the text to a text file for later analysis, with one line for each document's words"""
-    with open(os.path.join(coll_directory, 'extracted_text', f'{id}_text.txt'), 'w') as f:
-        for line_list in text_list:
-            try:
-                f.write(f'{"|".join(line_list)}\n')
-            except UnicodeEncodeError:
-                print('Skipped line, unicode issues')
+# Tika reads every format, so it is the default reader for every file.
+registry = ExtractorRegistry()
+registry.set_default_reader(read)
+
+# Client for the Tika server, set by the script (or benchmark_extractors.py) to a TikaClient that it closes when done.
+# It is not made when the module is imported, so importing does not open a session that is never closed.
+tika_client = None
 
 
 def success_rate(folder, success, total):
@@ -65,18 +92,8 @@ def success_rate(folder, success, total):
 
 def test_result():
     """For the proof of concept, test that test_input_directory gives the expected result."""
-    expected = [['file', 'skipped', '/docprops/thumbnailjpeg'],
-                ['word', 'test', 'file', 'word', 'word', 'word', 'word', 'word'],
-                ['another', 'word', 'test', 'file', 'test', 'file', 'test', 'file'],
-                ['multiple', 'page', 'page', '1',
-                 'line', 'text', 'line', 'text', 'line', 'text', 'line', 'text', 'line', 'text', 'line', 'text',
-                 'line', 'text', 'line', 'text', 'line', 'text', 'line', 'text', 'line', 'text', 'line', 'text',
-                 'line', 'text', 'line', 'text', 'line', 'text', 'line', 'text', 'line', 'text', 'line', 'text',
-                 'line', 'text', 'line', 'text', 'line', 'text', 'line', 'text', 'line', 'text',
-                 'multiple', 'page', 'page', '2', 'line', 'text', 'line', 'text', 'line', 'text'],
-                ['first', 'test', 'one', 'one', 'one', 'one', 'one', 'one'],
-                ['second', 'test', 'file', 'two', 'two', 'two', 'two', 'two', 'two'],
-                ['test', 'file', 'text', 'test', 'test', 'test']]
+    coll_text = read_text(text_path(os.path.join(coll_directory, 'extracted_text'), os.path.basename(coll_directory)))
+    expected = EXPECTED_COLL_TEXT
     result_match = coll_text == expected
 
     if result_match is True:
@@ -90,89 +107,58 @@ def test_result():
                 print("Result:  ", text)
 
 
-def text_to_clean_list(text_string):
-    """Convert a string to a list of words, with some clean up
-
-    Parameter:
-        text_string : text contents of a file (string)
-
-    Returns:
-        List of words, lowercase and without stop words
-    """
-    # Makes all characters lowercase.
-    text_string = text_string.lower()
-
-    # Removes punctuation and other non-word characters to reduce the variation of words.
-    # These cannot be removed as stop words because they are not entire words.
-    remove_characters = ['.', '!', '?', ',', ';', '\r', '\t']
-    for character in remove_characters:
-        text_string = text_string.replace(character, '')
-
-    # Makes a list of words by splitting the string at spaces and newlines, and then removing empty strings.
-    text_list = re.split('[\n ]', text_string)
-    text_list = [x for x in text_list if x]
-
-    # Reads a CSV of default words to remove that do not indicate subjects, like "the", into a list.
-    df = pd.read_csv(os.path.join(os.getcwd(), '..', 'parse-file-list', 'stop_list.csv'))
-    stop_words = df['Term'].to_list()
-
-    # Makes a list of every word in text_list that is not in stop_words.
-    clean_text_list = []
-    for word in text_list:
-        if word not in stop_words:
-            clean_text_list.append(word)
-
-    return clean_text_list
-
-
 if __name__ == '__main__':
 
-    # Assigns script argument to a variable
+    # Assigns script arguments to variables.
     coll_directory = sys.argv[1]
+    max_concurrent = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+    # Starts the local Tika server if it is not already running, like the tika library does before parsing a file.
+    if DEFAULT_ENDPOINT == f'http://{tika.ServerHost}:{tika.Port}':
+        tika.checkTikaServer()
 
     # Makes a folder for script output in the coll_directory, if it doesn't already exist.
     # It is only likely to exist when running this script repeatedly for testing.
     if not os.path.exists(os.path.join(coll_directory, 'extracted_text')):
         os.mkdir(os.path.join(coll_directory, 'extracted_text'))
 
-    # Starts variables for reading every file in the collection directory.
-    coll_text = []
+    # Starts variables for counting the files in the collection directory.
+    coll_name = os.path.basename(coll_directory)
+    coll_read = 0
     coll_files = 0
 
-    # For each AIP (first level folder within coll_directory),
-    # finds and tries to read each file in that AIP.
-    for aip in os.listdir(coll_directory):
-
-        # Skip the output folder. During testing, each technique had a different output folder.
-        if aip.startswith('extracted_text'):
-            continue
-
-        # Starts variables for reading every file in the AIP directory.
-        aip_text = []
-        aip_files = 0
-
-        for root, dirs, files in os.walk(os.path.join(coll_directory, aip)):
-            coll_files += len(files)
-            aip_files += len(files)
-
-            for file in files:
-                file_path = os.path.join(coll_directory, aip, root, file)
-                file_text = read(file_path)
+    # Saves each document's words to the AIP and collection text files in coll_directory as soon as it is read,
+    # instead of keeping the text for the whole collection in memory until the end.
+    # Files that were already read in an earlier run are not read again if they have not changed since then,
+    # using the manifest in the extracted_text folder. Delete manifest.jsonl and tokens.jsonl to read everything again.
+    # Only words saved by this script from the same Tika server with the same clean up are used.
+    manifest_reader = reader_key('tika', get_stop_words(), remove_characters=REMOVE_CHARACTERS + REMOVE_WHITESPACE,
+                                 endpoint=DEFAULT_ENDPOINT)
+    # The Tika client sends up to max_concurrent files at once and closes its connections at the end.
+    with TikaClient(DEFAULT_ENDPOINT, max_concurrent) as tika_client, \
+            StreamingTextWriter(os.path.join(coll_directory, 'extracted_text'), coll_name) as writer, \
+            ExtractionManifest(os.path.join(coll_directory, 'extracted_text'), coll_directory,
+                               manifest_reader) as manifest:
+
+        # For each AIP (first level folder within coll_directory), sends each file in that AIP to Tika,
+        # with up to max_concurrent files at once, and gets the text of each file in the original order.
+        for aip, aip_files, file_texts in iter_collection(coll_directory, registry.read, map_files=tika_client.map,
+                                                              manifest=manifest):
+            writer.start_aip(aip)
+            aip_read = 0
+            for file_text in file_texts:
                 if file_text:
-                    coll_text.append(file_text)
-                    aip_text.append(file_text)
-
-        # Saves the AIP text to a file in coll_directory.
-        save_text(aip, aip_text)
-
-        # Calculates and prints the success rate of reading the files for the AIP.
-        success_rate(aip, len(aip_text), aip_files)
+                    writer.write(file_text)
+                    aip_read += 1
+            writer.end_aip()
+            coll_read += aip_read
+            coll_files += aip_files
 
-    # Saves the collection text to a file in coll_directory.
-    save_text(os.path.basename(coll_directory), coll_text)
+            # Calculates and prints the success rate of reading the files for the AIP.
+            success_rate(aip, aip_read, aip_files)
 
     # Calculates and prints the success rate of reading the files for the entire collection.
-    success_rate(os.path.basename(coll_directory), len(coll_text), coll_files)
+    success_rate(coll_name, coll_read, coll_files)
 
     # Test that test_input_directory gave the expected output.
     # test_result()
@@ -0,0 +1,96 @@
+"""Save the words for each document to the extracted_text folder as soon as the document is read
+
+The read-files scripts used to keep every document's words in memory (aip_text and coll_text)
+and save them at the end, which uses a lot of memory for a large collection and loses everything if a run stops.
+StreamingTextWriter instead adds each document's line to the AIP and collection text files right away.
+
+The files are the same as the ones made by save_text: one line per document, with the words separated by "|".
+A document with characters that cannot be saved in the default encoding is skipped, with a message.
+"""
+import os
+
+
+class StreamingTextWriter:
+    """Add one line per document to the text file for the current AIP and the text file for the collection
+
+    :parameter
+        output_directory : path to the extracted_text folder (string)
+        coll_name : name of the collection, used for the collection text file name (string)
+        flush_every : the number of documents to save before sending the buffered text to the operating system (integer)
+        fsync : if True, also asks the operating system to write the text to disk each time it flushes (boolean)
+    """
+
+    def __init__(self, output_directory, coll_name, flush_every=100, fsync=False):
+        self.output_directory = output_directory
+        self.flush_every = flush_every
+        self.fsync = fsync
+        self.aip_file = None
+        self.unflushed = 0
+        self.coll_file = open(text_path(output_directory, coll_name), 'w')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def start_aip(self, aip):
+        """Start the text file for an AIP, which finishes the text file for the previous AIP"""
+        self.end_aip()
+        self.aip_file = open(text_path(self.output_directory, aip), 'w')
+
+    def end_aip(self):
+        """Finish the text file for the current AIP, if there is one"""
+        if self.aip_file:
+            self._flush(self.aip_file)
+            self.aip_file.close()
+            self.aip_file = None
+
+    def write(self, line_list):
+        """Save the words for one document to the AIP and collection text files
+
+        :parameter
+            line_list : the words from one document (list of strings)
+
+        :return
+            None
+        """
+        line = f'{"|".join(line_list)}\n'
+        for open_file in (self.aip_file, self.coll_file):
+            if open_file is None:
+                continue
+            try:
+                open_file.write(line)
+            except UnicodeEncodeError:
+                print('Skipped line, unicode issues')
+
+        # Limits how much text is waiting in memory and how much would be lost if the run stops.
+        self.unflushed += 1
+        if self.unflushed >= self.flush_every:
+            if self.aip_file:
+                self._flush(self.aip_file)
+            self._flush(self.coll_file)
+            self.unflushed = 0
+
+    def close(self):
+        """Finish the AIP and collection text files"""
+        self.end_aip()
+        if not self.coll_file.closed:
+            self._flush(self.coll_file)
+            self.coll_file.close()
+
+    def _flush(self, open_file):
+        open_file.flush()
+        if self.fsync:
+            os.fsync(open_file.fileno())
+
+
+def text_path(output_directory, id):
+    """Calculate the path to the text file for an AIP or collection in the extracted_text folder"""
+    return os.path.join(output_directory, f'{id}_text.txt')
+
+
+def read_text(path):
+    """Read a text file made by StreamingTextWriter or save_text back into a list of word lists, for testing"""
+    with open(path) as f:
+        return [line.rstrip('\n').split('|') for line in f]
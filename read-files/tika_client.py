@@ -0,0 +1,150 @@
+"""Client for sending many files to a Tika server, used by read_files_tika.py
+
+The tika library opens a new connection for every file, and the script used to wait 10 seconds after each one
+so the server would not be overwhelmed. This client instead reuses one HTTP session (keeping connections open),
+limits the number of requests in progress at once, and only waits when the server says it is busy
+(HTTP 429 or 503) or the connection fails, retrying with a backoff that doubles after each attempt.
+
+The text is requested from the same endpoint (/rmeta/text) as tika.parser.from_file, with the file name in the
+Content-Disposition header like the tika library, which Tika uses to help detect formats that share a container
+(like xps and other zip files). The content of the document and any embedded documents is combined the same way,
+so the words are the same as with the tika library.
+
+tika_stub_server.py in this folder is a stand-in for a Tika server to test the client without Java or a network.
+"""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import os
+import random
+import requests
+from requests.adapters import HTTPAdapter
+import time
+from urllib.parse import quote
+
+# Default server is the same as the tika library: the TIKA_SERVER_ENDPOINT environment variable or local port 9998.
+DEFAULT_ENDPOINT = os.getenv('TIKA_SERVER_ENDPOINT', 'http://localhost:9998')
+
+# Status codes where the server is busy or briefly unavailable and the request should be tried again.
+RETRY_STATUS = (429, 502, 503, 504)
+
+# Status codes where Tika could not parse the format, which is a normal result and not an error.
+UNREADABLE_STATUS = (415, 422)
+
+
+class TikaClient:
+    """Send files to a Tika server over one shared session, with a limit on requests in progress
+
+    :parameter
+        endpoint : URL for the Tika server (string)
+        max_concurrent : the most requests to have in progress at once (integer)
+        retries : the number of times to try again if the server is busy or the connection fails (integer)
+        backoff : seconds to wait before the first retry, which doubles for each retry after that (float)
+        max_backoff : the most seconds to wait before a retry (float)
+        timeout : seconds to wait for the server to respond to one request (float)
+    """
+
+    def __init__(self, endpoint=DEFAULT_ENDPOINT, max_concurrent=4, retries=5, backoff=0.5, max_backoff=30.0,
+                 timeout=300.0):
+        self.endpoint = endpoint.rstrip('/')
+        self.max_concurrent = max_concurrent
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+
+        # One session for every request, with enough pooled connections for max_concurrent threads.
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrent)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def close(self):
+        """Close the connections in the session"""
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def extract_text(self, path):
+        """Get the text of a file from the Tika server
+
+        :parameter
+            path : path to a file (string)
+
+        :return
+            The text of the file and any embedded documents (string) or None if Tika could not read it
+        """
+        headers = {'Accept': 'application/json', 'Content-Disposition': content_disposition(path)}
+        with open(path, 'rb') as f:
+            for attempt in range(self.retries + 1):
+
+                # Sends the file from the beginning, in case an earlier attempt sent part of it.
+                f.seek(0)
+                try:
+                    response = self.session.put(f'{self.endpoint}/rmeta/text', data=f, headers=headers,
+                                                timeout=self.timeout)
+                except (requests.ConnectionError, requests.Timeout):
+                    if attempt == self.retries:
+                        raise
+                    self._wait(attempt)
+                    continue
+
+                if response.status_code in RETRY_STATUS and attempt < self.retries:
+                    self._wait(attempt, response.headers.get('Retry-After'))
+                    continue
+                if response.status_code in UNREADABLE_STATUS:
+                    return None
+                response.raise_for_status()
+                return _combine_content(response.json())
+
+    def map(self, read_file, paths):
+        """Run a function that uses this client on every path in threads, returning the results in the same order
+
+        Only max_concurrent paths are read at once, and only twice that many results are held waiting
+        to be returned, so paths can be a generator for a very large number of files.
+
+        :parameter
+            read_file : function that takes the path to a file (string)
+            paths : the paths to the files (iterable of strings)
+
+        :return
+            Generator of the result of read_file for each path, in the order of paths
+        """
+        with ThreadPoolExecutor(self.max_concurrent) as executor:
+            pending = deque()
+            for path in paths:
+                pending.append(executor.submit(read_file, path))
+                if len(pending) >= self.max_concurrent * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def _wait(self, attempt, retry_after=None):
+        """Wait before a retry, using the server's Retry-After seconds if it gave one"""
+        if retry_after and retry_after.isdigit():
+            delay = float(retry_after)
+        else:
+            # Random jitter keeps the threads from all retrying at the same moment.
+            delay = self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+        time.sleep(min(delay, self.max_backoff))
+
+
+def content_disposition(path):
+    """Make the Content-Disposition header with the file name, the same as the tika library
+
+    Headers can only have ASCII characters, so other characters in the name are percent-encoded,
+    which keeps the extension that Tika uses.
+    """
+    file_name = os.path.basename(path)
+    if not file_name.isascii():
+        file_name = quote(file_name)
+    return f'attachment; filename={file_name}'
+
+
+def _combine_content(metadata_list):
+    """Combine the text of a document and its embedded documents from a /rmeta/text response, like tika.parser"""
+    content = ''.join(item.get('X-TIKA:content') or '' for item in metadata_list)
+    return content or None
@@ -0,0 +1,90 @@
+"""Stand-in for a Tika server, to test tika_client.py and read_files_tika.py without Java or a network
+
+Answers PUT requests to /rmeta/text like Tika does, with a JSON list that has one dictionary for the document.
+Files that are UTF-8 text are returned as the content, and anything else gets status 422 (cannot parse).
+It can also pretend to be busy, answering the first requests with status 503, to test retries.
+
+Parameters (when run as a script):
+    port (optional): the port to listen on, default is 9998 (the Tika default)
+    busy_count (optional): the number of requests to answer with status 503 before working normally, default is 0
+
+Example, to run read_files_tika.py against the stand-in:
+    python tika_stub_server.py 9998
+    python read_files_tika.py test_input_directory
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import sys
+import threading
+
+
+class StubTikaHandler(BaseHTTPRequestHandler):
+    """Handle requests to the stand-in server, using the settings stored on the server"""
+
+    # Keeps connections open between requests, so the client can reuse them.
+    protocol_version = 'HTTP/1.1'
+
+    def do_PUT(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+        with self.server.lock:
+            self.server.request_count += 1
+            busy = self.server.request_count <= self.server.busy_count
+
+        if busy:
+            self._respond(503, b'', {'Retry-After': '0'})
+        elif self.path != '/rmeta/text':
+            self._respond(404, b'')
+        else:
+            try:
+                text = body.decode('utf-8')
+            except UnicodeDecodeError:
+                self._respond(422, b'')
+                return
+            metadata_list = [{'Content-Type': 'text/plain; charset=UTF-8', 'X-TIKA:content': text}]
+            self._respond(200, json.dumps(metadata_list).encode('utf-8'), {'Content-Type': 'application/json'})
+
+    def log_message(self, format, *args):
+        """Do not print a line for every request"""
+        pass
+
+    def _respond(self, status, body, headers=None):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_stub_server(port=0, busy_count=0):
+    """Start the stand-in server in a background thread
+
+    :parameter
+        port : the port to listen on (integer), default is 0 to use any free port
+        busy_count : the number of requests to answer with status 503 before working normally (integer)
+
+    :return
+        The server, which has a shutdown() method, and its URL (string)
+    """
+    server = ThreadingHTTPServer(('localhost', port), StubTikaHandler)
+    server.daemon_threads = True
+    server.busy_count = busy_count
+    server.request_count = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://localhost:{server.server_address[1]}'
+
+
+if __name__ == '__main__':
+
+    # Assigns script arguments to variables.
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 9998
+    busy_count = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+
+    server, url = start_stub_server(port, busy_count)
+    print(f'Stand-in Tika server running at {url}, press Ctrl+C to stop')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,184 @@
+"""Cluster the TF-IDF vectors of the descriptions, with a choice of method and of how the number of clusters is picked
+
+Methods:
+    kmeans : KMeans, which uses every description in each step. Best for smaller data.
+    minibatch : MiniBatchKMeans, trained one batch of descriptions at a time with partial_fit,
+                so it is faster for large data and can keep learning from new batches (partial_fit_batches).
+
+The number of clusters can be given, or picked from a list of candidates (choose_k). Each candidate is fit
+in a separate process and scored with the silhouette score (higher is better) or the inertia, using the elbow:
+the number after which adding more clusters stops lowering the inertia as much.
+
+Giving the same seed gives the same clusters every time for the same descriptions.
+With a seed and a ScoreCache (score_cache.py), choose_k saves each score and only fits the candidates
+that were not scored before for the same vectors and settings.
+"""
+from multiprocessing import Pool
+from score_cache import hash_sparse_matrix
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics import silhouette_score
+from threadpoolctl import threadpool_limits
+
+# Clustering methods and scores for picking the number of clusters that can be used.
+METHODS = ("kmeans", "minibatch")
+SCORES = ("silhouette", "inertia")
+
+# The most descriptions to use for the silhouette score, which compares every pair of descriptions.
+SILHOUETTE_SAMPLE_SIZE = 10000
+
+
+def make_model(n_clusters, method="kmeans", seed=None, batch_size=1024):
+    """Make the clustering model, which is not trained yet.
+
+    :parameter
+        n_clusters : the number of clusters (integer)
+        method : kmeans or minibatch (string)
+        seed : the random state, for getting the same clusters each time (integer), or None for different clusters
+        batch_size : for minibatch, the number of descriptions in each batch (integer)
+
+    :return
+        KMeans or MiniBatchKMeans
+    """
+    if method == "kmeans":
+        return KMeans(n_clusters=n_clusters, init="k-means++", max_iter=100, n_init=1, random_state=seed)
+    if method == "minibatch":
+        return MiniBatchKMeans(n_clusters=n_clusters, init="k-means++", max_iter=100, n_init=1,
+                               batch_size=batch_size, random_state=seed)
+    raise ValueError(f"Clustering method {method} is not one of {METHODS}")
+
+
+def iter_batches(vectors, batch_size):
+    """Yield the rows of the vectors in order, batch_size rows at a time."""
+    for start in range(0, vectors.shape[0], batch_size):
+        yield vectors[start:start + batch_size]
+
+
+def partial_fit_batches(model, batches):
+    """Train a MiniBatchKMeans one batch at a time, so the data does not all need to be in memory.
+
+    Can be called again with new batches to keep training the same model. The first batch must have
+    at least as many descriptions as the number of clusters.
+
+    :parameter
+        model : the MiniBatchKMeans to train
+        batches : the vectors for each batch (iterable of matrices with the same columns)
+
+    :return
+        The model
+    """
+    for batch in batches:
+        model.partial_fit(batch)
+    return model
+
+
+def fit_model(vectors, n_clusters, method="kmeans", seed=None, batch_size=1024, passes=10):
+    """Make and train the clustering model on the vectors.
+
+    :parameter
+        vectors : the TF-IDF vectors, one row per description (sparse matrix)
+        n_clusters : the number of clusters (integer)
+        method : kmeans or minibatch (string)
+        seed : the random state, for getting the same clusters each time (integer), or None for different clusters
+        batch_size : for minibatch, the number of descriptions in each batch (integer)
+        passes : for minibatch, the number of times to go through all the batches (integer)
+
+    :return
+        The trained model (KMeans or MiniBatchKMeans)
+    """
+    model = make_model(n_clusters, method, seed, batch_size)
+    if method == "minibatch":
+        for _ in range(passes):
+            partial_fit_batches(model, iter_batches(vectors, batch_size))
+    else:
+        model.fit(vectors)
+    return model
+
+
+def score_k(job):
+    """Fit a model with one number of clusters and score it, for choose_k.
+
+    Each process uses one thread, since choose_k already runs one process per CPU.
+
+    :parameter
+        job : the vectors, number of clusters, method, score, and seed (tuple)
+
+    :return
+        The score (float)
+    """
+    vectors, n_clusters, method, score, seed = job
+    with threadpool_limits(limits=1):
+        model = fit_model(vectors, n_clusters, method, seed)
+        if score == "inertia":
+            # The model score is the negative of the inertia of the vectors.
+            return -model.score(vectors)
+        sample_size = min(SILHOUETTE_SAMPLE_SIZE, vectors.shape[0])
+        return silhouette_score(vectors, model.predict(vectors), sample_size=sample_size, random_state=seed)
+
+
+def elbow(scores):
+    """Find the number of clusters at the elbow of the inertia scores (dictionary of number of clusters and inertia).
+
+    This is the number where the drop in inertia before it is the largest compared to the drop after it.
+    With fewer than three candidates there is no elbow, so it is the number with the lowest inertia.
+    """
+    candidates = sorted(scores)
+    if len(candidates) < 3:
+        return min(candidates, key=scores.get)
+    bends = {}
+    for before, k, after in zip(candidates, candidates[1:], candidates[2:]):
+        bends[k] = (scores[before] - scores[k]) - (scores[k] - scores[after])
+    return max(bends, key=bends.get)
+
+
+def score_settings(n_clusters, method, score, seed):
+    """Make the settings that change the score for one number of clusters, for the ScoreCache key (dictionary)."""
+    settings = {"n_clusters": n_clusters, "method": method, "score": score, "seed": seed}
+    if score == "silhouette":
+        settings["silhouette_sample_size"] = SILHOUETTE_SAMPLE_SIZE
+    return settings
+
+
+def choose_k(vectors, candidates, method="kmeans", score="silhouette", seed=None, workers=None, cache=None):
+    """Pick the number of clusters from the candidates, fitting and scoring each one in parallel.
+
+    :parameter
+        vectors : the TF-IDF vectors, one row per description (sparse matrix)
+        candidates : the numbers of clusters to try (iterable of integers, at least 2 and less than the descriptions)
+        method : kmeans or minibatch (string)
+        score : silhouette or inertia (string)
+        seed : the random state, for getting the same result each time (integer), or None
+        workers : the number of processes (integer), default is the number of CPUs
+        cache : ScoreCache for saving the scores and reusing them, or None. Only used with a seed,
+                since the scores are different every time without one.
+
+    :return
+        The number of clusters (integer) and a dictionary with the score for each candidate
+    """
+    if score not in SCORES:
+        raise ValueError(f"Score {score} is not one of {SCORES}")
+    candidates = list(candidates)
+    if seed is None:
+        cache = None
+
+    # Uses the saved scores, if there are any for these vectors and settings.
+    scores = {}
+    if cache:
+        vectors_hash = hash_sparse_matrix(vectors)
+        for k in candidates:
+            cached_score = cache.get(vectors_hash, score_settings(k, method, score, seed))
+            if cached_score is not None:
+                scores[k] = cached_score
+
+    # Fits and scores the rest.
+    new_candidates = [k for k in candidates if k not in scores]
+    if new_candidates:
+        with Pool(workers) as pool:
+            results = pool.map(score_k, [(vectors, k, method, score, seed) for k in new_candidates])
+        scores.update(zip(new_candidates, map(float, results)))
+        if cache:
+            cache.put_many(vectors_hash, [(score_settings(k, method, score, seed), scores[k]) for k in new_candidates])
+    scores = {k: scores[k] for k in candidates}
+
+    if score == "silhouette":
+        return max(scores, key=scores.get), scores
+    return elbow(scores), scores
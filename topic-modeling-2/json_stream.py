@@ -0,0 +1,160 @@
+"""Read the items of a list in a large JSON file one at a time, instead of loading the whole file into memory
+
+The input for topic-modeling-2 (input_data.json) and topic-modeling-3 (ushmm_dn.json) is a JSON object with lists,
+like {"names": [...], "descriptions": [...]}. iter_json_array reads the file in chunks and yields each item of one list
+as soon as it is read, so cleaning can start right away and memory does not grow with the size of the file.
+Other lists in the object are read past one item at a time without being kept.
+
+A JSON Lines file (extension .jsonl), with one item on each line, can be used instead (iter_json_lines).
+
+To use from a script in another folder of this repo, add this folder to sys.path before importing:
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'topic-modeling-2'))
+    from json_stream import iter_items
+"""
+import json
+import re
+
+# The number of characters to read from the file at a time.
+CHUNK_SIZE = 1024 * 1024
+
+# Whitespace that is allowed between JSON values.
+WHITESPACE_CHARACTERS = " \t\n\r"
+WHITESPACE_PATTERN = re.compile(r"[ \t\n\r]*")
+
+# The comma or end of list after an item, with the whitespace around it.
+ITEM_END_PATTERN = re.compile(r"[ \t\n\r]*([,\]])[ \t\n\r]*")
+
+# Characters that can come after a whole value: whitespace and the end of an item, list or object.
+VALUE_END_CHARACTERS = " \t\n\r,:]}"
+
+# Extensions for JSON Lines files.
+JSON_LINES_EXTENSIONS = (".jsonl", ".ndjson")
+
+
+class _ChunkReader:
+    """Decode JSON values one at a time from an open file, keeping only the part of the file not read yet."""
+
+    def __init__(self, open_file, chunk_size):
+        self.file = open_file
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.position = 0
+        self.end_of_file = False
+        self.decoder = json.JSONDecoder()
+
+    def read_more(self):
+        """Add the next chunk of the file to the buffer, dropping what was already decoded. False if at the end."""
+        chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            self.end_of_file = True
+            return False
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return True
+
+    def peek(self):
+        """Skip whitespace and return the next character, or an empty string at the end of the file."""
+        while True:
+            self.position = WHITESPACE_PATTERN.match(self.buffer, self.position).end()
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.read_more():
+                return ""
+
+    def expect(self, characters):
+        """Skip the next character, which must be one of the characters, and return it."""
+        character = self.peek()
+        if not character or character not in characters:
+            raise ValueError(f"Expected one of {characters!r} but found {character!r} in the JSON")
+        self.position += 1
+        return character
+
+    def value(self):
+        """Decode the next value, reading more of the file until the whole value is in the buffer."""
+        if self.position >= len(self.buffer) or self.buffer[self.position] in WHITESPACE_CHARACTERS:
+            self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+                # A number at the end of the buffer may continue in the next chunk (like 12 in 12.5),
+                # so the character after the value must be one that can come after a whole value.
+                if self.end_of_file or (end < len(self.buffer) and self.buffer[end] in VALUE_END_CHARACTERS):
+                    self.position = end
+                    return value
+            except json.JSONDecodeError:
+                if self.end_of_file:
+                    raise
+            self.read_more()
+
+    def iter_array(self):
+        """Yield each item of the list that starts at the next character."""
+        self.expect("[")
+        if self.peek() == "]":
+            self.position += 1
+            return
+        while True:
+            yield self.value()
+
+            # Most items are followed by a comma in the same chunk, which is found with one pattern match.
+            # Near the end of the chunk, expect reads more of the file first.
+            match = ITEM_END_PATTERN.match(self.buffer, self.position)
+            if match and match.end() < len(self.buffer):
+                if match.group(1) == "]":
+                    self.position = match.end(1)
+                    return
+                self.position = match.end()
+            elif self.expect(",]") == "]":
+                return
+
+
+def iter_json_array(file_path, key, chunk_size=CHUNK_SIZE):
+    """Yield the items of one list in a JSON object, one at a time, without reading the whole file into memory.
+
+    :parameter
+        file_path : path to a JSON file with an object at the top (string)
+        key : the name of the list in the object, for example descriptions (string)
+        chunk_size : the number of characters to read at a time (integer)
+
+    :return
+        Generator of the items in the list
+
+    :raises
+        KeyError : if the object does not have the key
+        ValueError : if the file is not valid JSON or the key is not a list
+    """
+    with open(file_path, "r", encoding="utf-8") as open_file:
+        reader = _ChunkReader(open_file, chunk_size)
+        reader.expect("{")
+        if reader.peek() == "}":
+            raise KeyError(key)
+        while True:
+            name = reader.value()
+            reader.expect(":")
+            if name == key:
+                yield from reader.iter_array()
+                return
+
+            # Reads past lists in the rest of the object one item at a time, since they may also be large.
+            if reader.peek() == "[":
+                for _ in reader.iter_array():
+                    pass
+            else:
+                reader.value()
+            if reader.expect(",}") == "}":
+                raise KeyError(key)
+
+
+def iter_json_lines(file_path):
+    """Yield the item on each line of a JSON Lines file, skipping blank lines."""
+    with open(file_path, "r", encoding="utf-8") as open_file:
+        for line in open_file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_items(file_path, key):
+    """Yield the items from a JSON Lines file (one item per line, key is not used)
+    or from the list named key in a JSON file."""
+    if file_path.lower().endswith(JSON_LINES_EXTENSIONS):
+        return iter_json_lines(file_path)
+    return iter_json_array(file_path, key)
@@ -0,0 +1,89 @@
+"""Save the scores for each number of clusters or topics, so a sweep only trains the numbers that have not been scored
+
+The scores are saved in a JSON file by a key made from a hash of the data (the corpus or the vectors)
+and the settings that change the score, including the number of clusters or topics. If the data or any setting
+changes, the key is different, so an old score is never used for new data. Adding more numbers to a sweep
+only trains the new numbers, since the others are already in the cache.
+
+Used by choose_k in clustering.py (topic-modeling-2) and sweep_topics in lda_training.py (topic-modeling-3).
+"""
+import hashlib
+import json
+import os
+
+# The number of bytes to read at a time when hashing a file.
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(path):
+    """Calculate the SHA-256 hash of a file, reading it a chunk at a time (string)"""
+    file_hash = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def hash_sparse_matrix(matrix):
+    """Calculate the SHA-256 hash of a scipy sparse matrix from its shape and CSR arrays (string)"""
+    matrix = matrix.tocsr()
+    if not matrix.has_sorted_indices:
+        matrix = matrix.sorted_indices()
+    matrix_hash = hashlib.sha256(repr(matrix.shape).encode())
+    for array in (matrix.indptr, matrix.indices, matrix.data):
+        matrix_hash.update(str(array.dtype).encode())
+        matrix_hash.update(array.tobytes())
+    return matrix_hash.hexdigest()
+
+
+def hash_values(values):
+    """Calculate the SHA-256 hash of values that can be saved as JSON, like a list of texts (string)"""
+    values_hash = hashlib.sha256()
+    for value in values:
+        values_hash.update(json.dumps(value).encode("utf-8"))
+        values_hash.update(b"\n")
+    return values_hash.hexdigest()
+
+
+class ScoreCache:
+    """Scores saved in a JSON file, by a hash of the data and the settings
+
+    :parameter
+        path : path to the JSON file, which is made the first time a score is saved (string)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.scores = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.scores = json.load(f)
+
+    @staticmethod
+    def make_key(data_hash, settings):
+        """Combine the data hash and the settings (dictionary that can be saved as JSON) into one key (string)"""
+        key_text = json.dumps({"data": data_hash, "settings": settings}, sort_keys=True)
+        return hashlib.sha256(key_text.encode("utf-8")).hexdigest()
+
+    def get(self, data_hash, settings):
+        """Find the saved score for the data and settings, or None if it has not been saved"""
+        return self.scores.get(self.make_key(data_hash, settings))
+
+    def put_many(self, data_hash, settings_and_scores):
+        """Save the scores for several settings and write the file
+
+        :parameter
+            data_hash : the hash of the data (string)
+            settings_and_scores : the settings (dictionary) and the score for each (iterable of tuples)
+
+        :return
+            None
+        """
+        for settings, score in settings_and_scores:
+            self.scores[self.make_key(data_hash, settings)] = score
+
+        # Writes to a temporary file first, so the cache is not left half written if the script is stopped.
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            json.dump(self.scores, f, indent=1)
+        os.replace(temporary_path, self.path)
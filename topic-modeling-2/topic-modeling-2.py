@@ -2,15 +2,52 @@
 Copy of example from YouTube series Topic Modeling by Python Tutorials for Digital Humanities (Dr. W.J.B. Mattingly)
 with additional comments and some renaming and functions to make more sense to me.
 Lesson 02.03 TF-IDF in Python with Scikit Learn
+
+The clustering method and number of clusters are set with the constants below (see clustering.py).
 """
+from functools import partial
 import json
+from multiprocessing import Pool
+import numpy as np
 import os
 import re
 import string
+from clustering import choose_k, fit_model
+from json_stream import iter_items
+from score_cache import ScoreCache
 from nltk.corpus import stopwords
-from sklearn.cluster import KMeans
 from sklearn.feature_extraction.text import TfidfVectorizer
 
+# Clustering method: kmeans (all descriptions at once) or minibatch (batches of descriptions, for large data).
+CLUSTER_METHOD = "kmeans"
+
+# The number of clusters, or None to pick it from K_CANDIDATES with the K_SCORE (silhouette or inertia).
+N_CLUSTERS = 20
+K_CANDIDATES = range(5, 41, 5)
+K_SCORE = "silhouette"
+
+# Scores for each number of clusters are saved here, so only new candidates are fit when the script is run again.
+SCORE_CACHE_PATH = os.path.join("topic-modeling-2", "k_scores.json")
+
+# Random state for the clustering, so the clusters are the same every time the script is run on the same data.
+RANDOM_SEED = 100
+
+# The number of processes for cleaning the descriptions. More than 1 is only faster for large inputs.
+CLEAN_WORKERS = 1
+
+# Months, which are added to the stop words for removing dates.
+MONTHS = ["January", "February", "March", "April", "May", "June", "July", "August",
+          "September", "October", "November", "December"]
+
+# Unique identifiers, for example AC/2000/142.
+ID_PATTERN = re.compile(r"AC/\d{1,4}/\d{1,4}")
+
+# Every punctuation character and number, which are removed together in one pass over the text.
+PUNCTUATION_NUMBER_PATTERN = re.compile(f"[{re.escape(string.punctuation)}\\d]")
+
+# Two or more spaces in a row.
+EXTRA_SPACES_PATTERN = re.compile(" {2,}")
+
 
 def load_json(file_path):
     """Read the json of the file at the provided path into a Python dictionary."""
@@ -19,62 +56,76 @@ def load_json(file_path):
         return data_dictionary
 
 
+def get_stops():
+    """Make the set of stop words: the standard English stop words plus the months, for removing dates.
+    Stopwords are things like 'a', 'the', etc. A set is used so checking each word is fast."""
+    return frozenset(stopwords.words("english") + MONTHS)
+
+
 def clean_one_description(text, stops):
     """Clean up a single description (string).
-    Removes unique IDs, stop words, punctuation, numbers, and extra spaces."""
+    Removes unique IDs, stop words, punctuation, numbers, and extra spaces.
+    stops should be a set (from get_stops), so checking each word does not search a list."""
 
     # Remove unique identifiers from text, for example AC/2000/142.
-    text = re.sub(r"AC\/\d{1,4}\/\d{1,4", "", text)
-
-    # Remove all stop words (articles, conjunctions, etc.)
-    # Tutorial said this is more verbose than necessary to be more clear. Did not show more concise way.
-    words_list = text.split()
-    cleaned_list = []
-    for word in words_list:
-        if word not in stops:
-            cleaned_list.append(word)
-
-    # Combine every item in the word list back into a single string.
-    cleaned_description = " ".join(cleaned_list)
+    text = ID_PATTERN.sub("", text)
 
-    # Remove all punctuation.
-    cleaned_description = cleaned_description.translate(str.maketrans("", "", string.punctuation))
+    # Remove all stop words (articles, conjunctions, etc.) and combine the other words back into a single string.
+    cleaned_description = " ".join([word for word in text.split() if word not in stops])
 
-    # Remove all numbers.
-    cleaned_description = "".join([i for i in cleaned_description if not i.isdigit()])
+    # Remove all punctuation and numbers.
+    cleaned_description = PUNCTUATION_NUMBER_PATTERN.sub("", cleaned_description)
 
-    # Remove extra spaces.
-    # For as long as there are two consecutive spaces in the string, will replace 2 spaces with 1.
-    while "  " in cleaned_description:
-        cleaned_description = cleaned_description.replace("  ", " ")
+    # Remove extra spaces, which are left where a word was only punctuation or numbers.
+    cleaned_description = EXTRA_SPACES_PATTERN.sub(" ", cleaned_description)
 
     # Returns the cleaned description (string).
     return cleaned_description
 
 
-def clean_descriptions(descriptions):
-    """Clean up every description (string) in a list of descriptions."""
+def clean_descriptions(descriptions, workers=CLEAN_WORKERS, chunksize=1000):
+    """Clean up every description (string) in a list or other iterable of descriptions, like iter_items().
+    With more than 1 worker, the descriptions are cleaned in parallel, chunksize descriptions at a time,
+    and are still returned in the same order."""
 
-    # Update standard stops list with the months, for removing dates.
-    # Stopwords are things like 'a', 'the', etc.
-    stops = stopwords.words("english")
-    months = ["January", "February", "March", "April", "May", "June", "July", "August",
-              "September", "October", "November", "December"]
-    stops = stops + months
+    stops = get_stops()
+    clean = partial(clean_one_description, stops=stops)
 
     # Iterate on every description in the list, clean it with a different function,
     # and add the cleaned version to a new list.
-    cleaned_list = []
-    for description in descriptions:
-        cleaned_description = clean_one_description(description, stops)
-        cleaned_list.append(cleaned_description)
+    if workers > 1:
+        with Pool(workers) as pool:
+            cleaned_list = list(pool.imap(clean, descriptions, chunksize=chunksize))
+    else:
+        cleaned_list = list(map(clean, descriptions))
 
     # Returns a list of the cleaned descriptions.
     return cleaned_list
 
 
-def cluster(descriptions):
-    """Divide the documents into 20 clusters based on word frequency."""
+def get_keywords(vectors, feature_names):
+    """Make a list of the terms with a score above 0 for each description, in the order of the feature names.
+
+    Uses the sparse matrix from the vectorizer directly instead of making a dense copy with a cell for every term,
+    which would use memory for every description times every term. In the CSR format, the term numbers for row i
+    are indices[indptr[i]:indptr[i + 1]], so only the terms that are in each description are looked at.
+    """
+    vectors = vectors.tocsr()
+    if not vectors.has_sorted_indices:
+        vectors = vectors.sorted_indices()
+
+    # Keeps every term with a score above 0 and finds where each description's terms end in the kept terms.
+    keep = vectors.data > 0
+    row_numbers = np.repeat(np.arange(vectors.shape[0]), np.diff(vectors.indptr))
+    row_ends = np.cumsum(np.bincount(row_numbers[keep], minlength=vectors.shape[0]))
+    kept_terms = np.asarray(feature_names)[vectors.indices[keep]]
+
+    return [terms.tolist() for terms in np.split(kept_terms, row_ends[:-1])]
+
+
+def cluster(descriptions, n_clusters=N_CLUSTERS, method=CLUSTER_METHOD, seed=RANDOM_SEED):
+    """Divide the documents into clusters based on word frequency.
+    If n_clusters is None, the number of clusters is picked from K_CANDIDATES."""
 
     # Customize vectorizer parameters to get better results.
     # max_df and min_df are the range of words to include; anything outside is too common or rare and excluded.
@@ -83,39 +134,33 @@ def cluster(descriptions):
                                  stop_words="english")
     vectors = vectorizer.fit_transform(descriptions)
     feature_names = vectorizer.get_feature_names_out()
-    dense = vectors.todense()
-    denselist = dense.tolist()
 
     # TODO: when have a smaller data set, print what this is doing to understand it
-    all_keywords = []
-    for description in denselist:
-        x = 0
-        keywords = []
-        for word in description:
-            if word > 0:
-                keywords.append(feature_names[x])
-            x = x + 1
-        all_keywords.append(keywords)
+    all_keywords = get_keywords(vectors, feature_names)
+
+    # Pick the number of clusters with the best score, if it was not given.
+    if n_clusters is None:
+        n_clusters, scores = choose_k(vectors, K_CANDIDATES, method, K_SCORE, seed,
+                                      cache=ScoreCache(SCORE_CACHE_PATH))
+        print(f"Scores ({K_SCORE}) for each number of clusters: {scores}")
+        print(f"Using {n_clusters} clusters")
 
     # Cluster key words from each document to see where there is overlap.
-    # true_k is the number of clusters.
-    true_k = 20
-    model = KMeans(n_clusters=true_k, init="k-means++", max_iter=100, n_init=1)
-    model.fit(vectors)
+    model = fit_model(vectors, n_clusters, method, seed)
     order_centroids = model.cluster_centers_.argsort()[:, ::-1]
     terms = vectorizer.get_feature_names_out()
 
     return order_centroids, terms
 
 
-def save_result(order_centroids, terms, true_k):
+def save_result(order_centroids, terms):
     """Save the 10 most frequent terms for each cluster to a text file."""
 
     # Document is named results.txt and saved to the same folder as the input data.
     with open(os.path.join("topic-modeling-2", "results.txt"), "w", encoding="utf-8") as f:
 
         # Make a block of text for each cluster.
-        for i in range(true_k):
+        for i in range(len(order_centroids)):
             f.write(f"Cluster {i}")
             f.write("\n")
 
@@ -126,17 +171,20 @@ def save_result(order_centroids, terms, true_k):
             f.write("\n")
 
 
-# Read the descriptions from the input data, which is json, into a list.
-# The json has two components, names and descriptions.
-# Each description is a string with one or more sentences and may include an identifier.
-descriptions_list = load_json(os.path.join("topic-modeling-2", "input_data.json"))["descriptions"]
+if __name__ == '__main__':
+
+    # Read the descriptions from the input data, which is json, one at a time.
+    # The json has two components, names and descriptions.
+    # Each description is a string with one or more sentences and may include an identifier.
+    # A JSON Lines file (input_data.jsonl) with one description per line can be used instead.
+    descriptions = iter_items(os.path.join("topic-modeling-2", "input_data.json"), "descriptions")
 
-# Remove portions of the descriptions which will interfere with the analysis,
-# like stop words and punctuation.
-descriptions_list = clean_descriptions(descriptions_list)
+    # Remove portions of the descriptions which will interfere with the analysis,
+    # like stop words and punctuation. Each description is cleaned as it is read.
+    descriptions_list = clean_descriptions(descriptions)
 
-# Divide descriptions into 20 clusters.
-clusters, terms = cluster(descriptions_list)
+    # Divide descriptions into clusters.
+    clusters, terms = cluster(descriptions_list)
 
-# Save the 10 most frequent terms for each cluster to a single text file.
-save_result(clusters, terms, 20)
+    # Save the 10 most frequent terms for each cluster to a single text file.
+    save_result(clusters, terms)
@@ -0,0 +1,206 @@
+"""Train the LDA model for topic-modeling-3 on one core or several, and for several numbers of topics at once
+
+The corpus is saved to disk as a Matrix Market file (MmCorpus) and read from there while training,
+one document at a time, instead of being kept in memory as a list.
+
+Training modes:
+    workers = 1 : LdaModel on one core, with alpha="auto", the same as the tutorial
+    workers > 1 : LdaMulticore, which splits each pass between worker processes.
+                  LdaMulticore does not support alpha="auto", so it uses a symmetric alpha.
+    train_grid : one model for each number of topics, trained at the same time in separate processes.
+                 Each of those uses LdaModel, since a process in a pool cannot start more processes.
+
+Every model is scored with CoherenceModel, so the best number of topics can be picked.
+Higher is better for both measures: u_mass (negative, calculated from the corpus)
+and c_v (between 0 and 1, calculated from the texts, which are needed for it).
+
+sweep_topics runs train_grid with a cache of the scores (score_cache.py in topic-modeling-2), by a hash of the corpus,
+dictionary and texts and the training settings, so adding more numbers of topics only trains the new ones.
+"""
+import inspect
+from multiprocessing import Pool
+import os
+import sys
+
+import gensim.corpora as corpora
+from gensim.models import CoherenceModel, LdaModel, LdaMulticore
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'topic-modeling-2'))
+from score_cache import ScoreCache, hash_file, hash_values
+
+# Coherence measures to calculate for each model. c_v is only calculated if the texts are given.
+COHERENCE_MEASURES = ("c_v", "u_mass")
+
+# Shared by every process in train_grid, so they are only sent to each process once.
+_grid_id2word = None
+_grid_texts = None
+
+
+def save_corpus(corpus, path, id2word=None):
+    """Save the corpus to a Matrix Market file and return it as an MmCorpus, which reads documents from the file.
+
+    :parameter
+        corpus : the bag of words for each document (iterable of lists of tuples with the word id and count)
+        path : path for the file, usually ending in .mm (string)
+        id2word : the dictionary (gensim Dictionary), or None
+
+    :return
+        MmCorpus
+    """
+    corpora.MmCorpus.serialize(path, corpus, id2word=id2word)
+    return corpora.MmCorpus(path)
+
+
+def train_lda(corpus, id2word, num_topics, workers=1, passes=10, chunksize=100, random_state=100):
+    """Train an LDA model, on one core with LdaModel or on several with LdaMulticore.
+
+    :parameter
+        corpus : the bag of words for each document, which is read once per pass (MmCorpus or list)
+        id2word : the dictionary (gensim Dictionary)
+        num_topics : the number of topics (integer)
+        workers : the number of worker processes (integer), where 1 uses LdaModel
+        passes : the number of times to train on the whole corpus (integer)
+        chunksize : the number of documents to train on at a time (integer)
+        random_state : seed for getting the same model each time (integer)
+
+    :return
+        LdaModel or LdaMulticore
+    """
+    if workers > 1:
+        return LdaMulticore(corpus=corpus, id2word=id2word, num_topics=num_topics, workers=workers,
+                            random_state=random_state, chunksize=chunksize, passes=passes, alpha="symmetric")
+    return LdaModel(corpus=corpus, id2word=id2word, num_topics=num_topics, random_state=random_state,
+                    update_every=1, chunksize=chunksize, passes=passes, alpha="auto")
+
+
+def coherence_scores(model, corpus, id2word, texts=None, processes=-1):
+    """Score a model with each coherence measure in COHERENCE_MEASURES.
+
+    :parameter
+        model : the LDA model
+        corpus : the bag of words for each document (MmCorpus or list)
+        id2word : the dictionary (gensim Dictionary)
+        texts : the words of each document (iterable of lists of strings), or None to skip c_v
+        processes : the number of processes for c_v (integer), where -1 is one less than the number of CPUs
+
+    :return
+        Dictionary with the measure as the key and the score (float) as the value
+    """
+    scores = {}
+    for measure in COHERENCE_MEASURES:
+        if measure == "u_mass":
+            coherence_model = CoherenceModel(model=model, corpus=corpus, dictionary=id2word, coherence=measure)
+        elif texts is not None:
+            coherence_model = CoherenceModel(model=model, texts=texts, dictionary=id2word, coherence=measure,
+                                             processes=processes)
+        else:
+            continue
+        scores[measure] = float(coherence_model.get_coherence())
+    return scores
+
+
+def _share_with_grid(id2word, texts):
+    """Save the dictionary and texts in each process of train_grid."""
+    global _grid_id2word, _grid_texts
+    _grid_id2word = id2word
+    _grid_texts = texts
+
+
+def _train_grid_model(job):
+    """Train, score and save the model for one number of topics, in a train_grid process."""
+    corpus_path, num_topics, model_folder, train_options = job
+    corpus = corpora.MmCorpus(corpus_path)
+    model = train_lda(corpus, _grid_id2word, num_topics, workers=1, **train_options)
+    scores = coherence_scores(model, corpus, _grid_id2word, _grid_texts, processes=1)
+    model_path = os.path.join(model_folder, f"lda_{num_topics}_topics.model")
+    model.save(model_path)
+    return num_topics, scores, model_path
+
+
+def train_grid(corpus_path, id2word, topic_counts, texts=None, model_folder=".", processes=None, **train_options):
+    """Train and score a model for each number of topics, with the models trained at the same time.
+
+    :parameter
+        corpus_path : path to the corpus saved with save_corpus, which each process reads from disk (string)
+        id2word : the dictionary (gensim Dictionary)
+        topic_counts : the numbers of topics to try (iterable of integers)
+        texts : the words of each document, for the c_v score (list of lists of strings or PhrasedCorpus), or None
+        model_folder : the folder to save each model to (string)
+        processes : the number of models to train at once (integer), default is the number of CPUs
+        train_options : other arguments for train_lda, like passes
+
+    :return
+        Dictionary with the number of topics as the key and a tuple with the scores and the path to the model
+    """
+    jobs = [(corpus_path, num_topics, model_folder, train_options) for num_topics in topic_counts]
+    with Pool(processes, initializer=_share_with_grid, initargs=(id2word, texts)) as pool:
+        results = pool.map(_train_grid_model, jobs, chunksize=1)
+    return {num_topics: (scores, model_path) for num_topics, scores, model_path in results}
+
+
+def best_topic_count(scores_by_count, measure=None):
+    """Find the number of topics with the highest coherence score.
+
+    :parameter
+        scores_by_count : dictionary with the number of topics as the key and the scores (dictionary) as the value
+        measure : the coherence measure to compare (string), default is c_v if it was calculated, otherwise u_mass
+
+    :return
+        The number of topics (integer)
+    """
+    if measure is None:
+        measure = "c_v" if all("c_v" in scores for scores in scores_by_count.values()) else "u_mass"
+    return max(scores_by_count, key=lambda num_topics: scores_by_count[num_topics][measure])
+
+
+def sweep_topics(corpus_path, id2word, topic_counts, texts=None, cache_path=None, model_folder=".", processes=None,
+                 **train_options):
+    """Score a model for each number of topics, training only the ones that are not already in the cache.
+
+    :parameter
+        corpus_path : path to the corpus saved with save_corpus (string)
+        id2word : the dictionary (gensim Dictionary)
+        topic_counts : the numbers of topics to try (iterable of integers)
+        texts : the words of each document, for the c_v score (list of lists of strings or PhrasedCorpus), or None
+        cache_path : path to the JSON file for the scores (string), or None to train every number of topics
+        model_folder : the folder to save each model that is trained to (string)
+        processes : the number of models to train at once (integer), default is the number of CPUs
+        train_options : other arguments for train_lda, like passes
+
+    :return
+        Dictionary with the number of topics as the key and the scores (dictionary) as the value,
+        and dictionary with the number of topics as the key and the path to the model, only for the ones trained now
+    """
+    topic_counts = list(topic_counts)
+    cache = ScoreCache(cache_path) if cache_path else None
+
+    # The settings include the train_lda defaults, so changing a default does not reuse old scores.
+    defaults = {name: parameter.default for name, parameter in inspect.signature(train_lda).parameters.items()
+                if parameter.default is not parameter.empty and name != "workers"}
+    defaults.update(train_options)
+
+    def settings(num_topics):
+        return {"num_topics": num_topics, "measures": list(COHERENCE_MEASURES), "texts": texts is not None,
+                "train_options": defaults}
+
+    scores_by_count = {}
+    if cache:
+        corpus_hash = hash_values([hash_file(corpus_path), hash_values(sorted(id2word.token2id.items())),
+                                   hash_values(texts) if texts is not None else None])
+        for num_topics in topic_counts:
+            cached_scores = cache.get(corpus_hash, settings(num_topics))
+            if cached_scores is not None:
+                scores_by_count[num_topics] = cached_scores
+
+    model_paths = {}
+    new_counts = [num_topics for num_topics in topic_counts if num_topics not in scores_by_count]
+    if new_counts:
+        results = train_grid(corpus_path, id2word, new_counts, texts, model_folder, processes, **train_options)
+        for num_topics, (scores, model_path) in results.items():
+            scores_by_count[num_topics] = scores
+            model_paths[num_topics] = model_path
+        if cache:
+            cache.put_many(corpus_hash, [(settings(num_topics), scores_by_count[num_topics])
+                                         for num_topics in new_counts])
+
+    return {num_topics: scores_by_count[num_topics] for num_topics in topic_counts}, model_paths
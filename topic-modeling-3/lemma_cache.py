@@ -0,0 +1,151 @@
+"""Save lemmatized texts in a SQLite database, so running topic-modeling-3 again does not lemmatize them again
+
+Each text is saved by the SHA-256 hash of its contents and a key for the model that lemmatized it
+(the spaCy model, its version, and the parts of speech kept), so a changed text or a different model
+is lemmatized again instead of using an old result. Texts that are in the cache are not sent to spaCy at all,
+and if every text is in the cache, spaCy is not even loaded.
+
+The cache has a maximum size. When it is bigger than that, the texts that were used the longest ago are deleted.
+"""
+from collections import deque
+import hashlib
+import sqlite3
+import time
+
+# The most texts to look up in the database with one query (SQLite limits the number of values in a query).
+LOOKUP_SIZE = 500
+
+
+def text_hash(text):
+    """Calculate the SHA-256 hash of a text (string), for finding it in the cache"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class LemmaCache:
+    """SQLite database of lemmatized texts
+
+    :parameter
+        path : path to the database file, which is made if it does not exist (string)
+        max_bytes : the most bytes of lemmatized text to keep (integer)
+    """
+
+    def __init__(self, path, max_bytes=1024 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS lemmas (doc_hash TEXT NOT NULL, model TEXT NOT NULL, "
+                                "lemmas TEXT NOT NULL, size INTEGER NOT NULL, last_used INTEGER NOT NULL, "
+                                "PRIMARY KEY (doc_hash, model))")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS lemmas_last_used ON lemmas (last_used)")
+        self.connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Delete old texts if the cache is too big and close the database"""
+        self.evict()
+        self.connection.close()
+
+    def get_many(self, doc_hashes, model):
+        """Find the lemmatized texts for the hashes that are in the cache, and mark them as used
+
+        :parameter
+            doc_hashes : the hashes of the texts, from text_hash (list of strings)
+            model : the key for the model (string)
+
+        :return
+            Dictionary with the hash as the key and the lemmatized text as the value, only for hashes that were found
+        """
+        found = {}
+        now = time.time_ns()
+        for start in range(0, len(doc_hashes), LOOKUP_SIZE):
+            batch = doc_hashes[start:start + LOOKUP_SIZE]
+            placeholders = ", ".join("?" * len(batch))
+            rows = self.connection.execute(f"SELECT doc_hash, lemmas FROM lemmas WHERE model = ? "
+                                           f"AND doc_hash IN ({placeholders})", [model, *batch])
+            found.update(rows)
+            self.connection.execute(f"UPDATE lemmas SET last_used = ? WHERE model = ? "
+                                    f"AND doc_hash IN ({placeholders})", [now, model, *batch])
+        self.connection.commit()
+        return found
+
+    def put_many(self, items, model):
+        """Save lemmatized texts
+
+        :parameter
+            items : the hash and lemmatized text for each text (iterable of tuples)
+            model : the key for the model (string)
+
+        :return
+            None
+        """
+        now = time.time_ns()
+        self.connection.executemany("INSERT OR REPLACE INTO lemmas VALUES (?, ?, ?, ?, ?)",
+                                    [(doc_hash, model, lemmas, len(lemmas.encode("utf-8")), now)
+                                     for doc_hash, lemmas in items])
+        self.connection.commit()
+
+    def evict(self):
+        """Delete the texts used the longest ago until the cache is no bigger than max_bytes"""
+
+        # Adds up the sizes from the most recently used text back and deletes every text after the total is too big.
+        self.connection.execute("DELETE FROM lemmas WHERE rowid IN (SELECT rowid FROM (SELECT rowid, SUM(size) "
+                                "OVER (ORDER BY last_used DESC, rowid DESC) AS total FROM lemmas) WHERE total > ?)",
+                                [self.max_bytes])
+        self.connection.commit()
+
+    def lemmatize(self, texts, lemmatize, model, lookup_size=1000):
+        """Get the lemmatized version of each text, from the cache or from lemmatize, in the same order as the texts
+
+        Texts are looked up lookup_size at a time and only the ones not in the cache are given to lemmatize,
+        which is called once. New results are saved to the cache as they are made.
+
+        :parameter
+            texts : the texts to lemmatize (iterable of strings)
+            lemmatize : function that takes an iterable of texts and yields the lemmatized version of each, in order
+            model : the key for the model, which must change if lemmatize would give different results (string)
+            lookup_size : the number of texts to look up in the cache at a time (integer)
+
+        :return
+            Generator of lemmatized texts (strings)
+        """
+        # The hash of each text read so far that has not been yielded yet, with the cached result or None.
+        pending = deque()
+
+        def texts_to_lemmatize():
+            """Look up the texts in batches, and yield the ones that are not in the cache"""
+            batch = []
+            for text in texts:
+                batch.append(text)
+                if len(batch) == lookup_size:
+                    yield from look_up(batch)
+                    batch = []
+            yield from look_up(batch)
+
+        def look_up(batch):
+            doc_hashes = [text_hash(text) for text in batch]
+            found = self.get_many(doc_hashes, model)
+            for text, doc_hash in zip(batch, doc_hashes):
+                pending.append((doc_hash, found.get(doc_hash)))
+                if doc_hash not in found:
+                    yield text
+
+        new = []
+        for lemmas in lemmatize(texts_to_lemmatize()):
+            # Yields the cached texts that come before this one.
+            while pending[0][1] is not None:
+                yield pending.popleft()[1]
+            doc_hash = pending.popleft()[0]
+            new.append((doc_hash, lemmas))
+            if len(new) == lookup_size:
+                self.put_many(new, model)
+                new = []
+            yield lemmas
+        self.put_many(new, model)
+
+        # Yields the cached texts after the last one that was lemmatized.
+        while pending:
+            yield pending.popleft()[1]
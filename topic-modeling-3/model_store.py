@@ -0,0 +1,218 @@
+"""Save the LDA model so it loads quickly and can be shared by several processes, and reject models that are stale
+
+The large arrays of the model (the topic word weights and the training statistics) are saved in their own .npy files
+next to the model file, and load_model memory-maps them read-only (mmap="r"). The arrays are only read from disk
+as they are used, and every process that loads the same model shares one copy of them through the page cache,
+instead of each process having its own copy. A model loaded this way can be used for inference but not trained more.
+
+A header (the model path plus .header.json) is saved after the model files, with the format version, the gensim version,
+a hash of the dictionary, and a hash and sizes of the model files. load_model raises StaleModelError if the header
+is missing or does not match, for example if the model was saved by an older version of this code or of gensim,
+was trained with a different dictionary, or its files were changed after the header was saved.
+
+measure_cold_start loads the model in a new process and reports the time and memory (RSS) it took,
+split into memory only that process uses and memory from files that other processes can share.
+"""
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import gensim
+from gensim.models import LdaModel
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'topic-modeling-2'))
+from score_cache import hash_file, hash_values
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, so only the time is reported there.
+    resource = None
+
+# Changes when the way models are saved changes, so models saved before that are rejected instead of loaded.
+MODEL_FORMAT_VERSION = 1
+
+# Added to the model path for the header file.
+HEADER_SUFFIX = ".header.json"
+
+# Arrays with at least this many values are saved in their own file, so they can be memory-mapped.
+# gensim compares it to the number of values in the array, not the number of bytes.
+SEP_LIMIT = 10000
+
+# The lines of /proc/self/status (Linux) with the memory used only by this process and the memory from files.
+PRIVATE_RSS_FIELDS = ("RssAnon", "RssShmem")
+SHARED_RSS_FIELDS = ("RssFile",)
+
+
+class StaleModelError(ValueError):
+    """The saved model has no header, or its header does not match this code, the dictionary or the model files"""
+
+
+def dictionary_hash(id2word):
+    """Calculate the SHA-256 hash of the words and ids in a dictionary (gensim Dictionary), the same as sweep_topics"""
+    return hash_values(sorted(id2word.token2id.items()))
+
+
+def model_files(path):
+    """Find the model file and the files saved with it, like the arrays and the state, without the header (list)"""
+    return [path] + sorted(file_path for file_path in glob.glob(f"{glob.escape(path)}.*")
+                           if not file_path.endswith(HEADER_SUFFIX))
+
+
+def save_model(model, path, sep_limit=SEP_LIMIT):
+    """Save the model with its large arrays in separate files that can be memory-mapped, and then the header.
+
+    The old header is deleted first, so if saving is stopped partway the model is rejected instead of loaded.
+
+    :parameter
+        model : the LDA model (LdaModel or LdaMulticore)
+        path : path for the model file (string)
+        sep_limit : arrays with at least this many values are saved in their own file (integer)
+
+    :return
+        The header (dictionary)
+    """
+    header_path = path + HEADER_SUFFIX
+    if os.path.exists(header_path):
+        os.remove(header_path)
+
+    model.save(path, sep_limit=sep_limit)
+
+    header = {"format_version": MODEL_FORMAT_VERSION,
+              "gensim_version": gensim.__version__,
+              "model_class": type(model).__name__,
+              "num_topics": model.num_topics,
+              "num_terms": model.num_terms,
+              "dictionary_hash": dictionary_hash(model.id2word),
+              "model_hash": hash_file(path),
+              "file_sizes": {os.path.basename(file_path): os.path.getsize(file_path)
+                             for file_path in model_files(path)}}
+
+    # Writes to a temporary file first, so the header is not left half written if the script is stopped.
+    temporary_path = f"{header_path}.tmp"
+    with open(temporary_path, "w", encoding="utf-8") as f:
+        json.dump(header, f, indent=1)
+    os.replace(temporary_path, header_path)
+    return header
+
+
+def check_header(path, id2word=None):
+    """Read the header of a saved model and check that the model can be used.
+
+    The arrays are checked by size and not by hash, so checking does not read them and loading stays fast.
+
+    :parameter
+        path : path to the model file (string)
+        id2word : the dictionary the model must have been trained with (gensim Dictionary), or None to not check it
+
+    :return
+        The header (dictionary)
+
+    :raises
+        StaleModelError : if the header is missing or does not match
+    """
+    header_path = path + HEADER_SUFFIX
+    if not os.path.exists(header_path):
+        raise StaleModelError(f"{path} has no header ({header_path}), so it was not saved with save_model")
+    with open(header_path, "r", encoding="utf-8") as f:
+        header = json.load(f)
+
+    if header.get("format_version") != MODEL_FORMAT_VERSION:
+        raise StaleModelError(f"{path} was saved in format {header.get('format_version')}, "
+                              f"but format {MODEL_FORMAT_VERSION} is needed")
+    if header["gensim_version"] != gensim.__version__:
+        raise StaleModelError(f"{path} was saved with gensim {header['gensim_version']}, "
+                              f"but gensim {gensim.__version__} is installed")
+    if id2word is not None and header["dictionary_hash"] != dictionary_hash(id2word):
+        raise StaleModelError(f"{path} was trained with a different dictionary")
+
+    folder = os.path.dirname(path)
+    for file_name, size in header["file_sizes"].items():
+        file_path = os.path.join(folder, file_name)
+        if not os.path.exists(file_path) or os.path.getsize(file_path) != size:
+            raise StaleModelError(f"{file_path} is missing or was changed after {path} was saved")
+    if hash_file(path) != header["model_hash"]:
+        raise StaleModelError(f"{path} was changed after it was saved")
+    return header
+
+
+def load_model(path, id2word=None, mmap="r"):
+    """Check the header of a saved model and load it, with the large arrays memory-mapped.
+
+    :parameter
+        path : path to the model file saved with save_model (string)
+        id2word : the dictionary the model must have been trained with (gensim Dictionary), or None to not check it
+        mmap : "r" to memory-map the arrays read-only, shared by every process that loads the model,
+               or None to read them into memory (string)
+
+    :return
+        LdaModel or LdaMulticore
+
+    :raises
+        StaleModelError : if the header is missing or does not match
+    """
+    check_header(path, id2word)
+    return LdaModel.load(path, mmap=mmap)
+
+
+def memory_mb():
+    """The memory (RSS) this process uses now, in MB.
+
+    :return
+        Dictionary with rss (the total), private (only this process) and shared (from files, like memory-mapped arrays).
+        On Linux these come from /proc/self/status. On other systems, only rss is given and it is the peak,
+        and on Windows nothing is given.
+    """
+    try:
+        with open("/proc/self/status", "r", encoding="utf-8") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+    except OSError:
+        if resource is None:
+            return {}
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and in kilobytes on other systems.
+        return {"rss": max_rss / 1024 / 1024 if sys.platform == "darwin" else max_rss / 1024}
+
+    def field_mb(names):
+        # The values look like "1234 kB".
+        return sum(int(fields[name].split()[0]) for name in names if name in fields) / 1024
+
+    return {"rss": field_mb(("VmRSS",)), "private": field_mb(PRIVATE_RSS_FIELDS), "shared": field_mb(SHARED_RSS_FIELDS)}
+
+
+def _cold_start(job):
+    """Load the model and use it on one document in a new process, and return the time and the memory it added."""
+    path, mmap, test_doc = job
+    memory_before = memory_mb()
+    start = time.perf_counter()
+    model = load_model(path, mmap=mmap)
+    load_seconds = time.perf_counter() - start
+    if test_doc is not None:
+        model[test_doc]
+    first_seconds = time.perf_counter() - start
+    memory_after = memory_mb()
+    report = {"load_seconds": load_seconds, "first_inference_seconds": first_seconds}
+    for name, value in memory_after.items():
+        report[f"{name}_mb"] = value - memory_before[name]
+    return report
+
+
+def measure_cold_start(path, test_doc=None, mmap="r"):
+    """Load the model in a new process, like a worker starting up, and report how long it took and the memory it added.
+
+    :parameter
+        path : path to the model file saved with save_model (string)
+        test_doc : the bag of words for a document to find the topics of after loading
+                   (list of tuples with the word id and count), or None to only load the model
+        mmap : "r" to memory-map the arrays or None to read them into memory, passed to load_model (string)
+
+    :return
+        Dictionary with load_seconds, first_inference_seconds (loading and the test_doc),
+        and the memory added by loading in MB (rss_mb, private_mb and shared_mb, as in memory_mb)
+    """
+    # A new interpreter (spawn), so the model and libraries already loaded in this process are not shared with it.
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        return pool.apply(_cold_start, ((path, mmap, test_doc),))
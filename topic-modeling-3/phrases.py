@@ -0,0 +1,96 @@
+"""Find bigrams and trigrams without keeping copies of the whole corpus in memory
+
+The words of each document are saved to a text file, one document per line (TokenCorpus), which can be read
+as many times as needed. The bigram and trigram models are trained from the file and then frozen (FrozenPhrases),
+which keeps only the phrases that are used, and PhrasedCorpus adds the phrases to each document as it is read,
+instead of making a list of every document with bigrams and another with trigrams.
+"""
+from itertools import islice
+
+from gensim.models.phrases import Phrases
+
+
+class TokenCorpus:
+    """Words of each document, read from a text file with the words of one document on each line, separated by spaces
+
+    The words cannot have spaces or line breaks in them, which is true for the words from gensim simple_preprocess.
+
+    :parameter
+        path : path to the text file (string)
+        doc_count : the number of documents in the file (integer), or None to count them when needed
+    """
+
+    def __init__(self, path, doc_count=None):
+        self.path = path
+        self.doc_count = doc_count
+
+    @classmethod
+    def write(cls, path, docs):
+        """Save the words of each document to the file, one document at a time, and return the TokenCorpus
+
+        :parameter
+            path : path to the text file (string)
+            docs : the words of each document (iterable of lists of strings)
+
+        :return
+            TokenCorpus
+        """
+        doc_count = 0
+        with open(path, "w", encoding="utf-8") as f:
+            for doc in docs:
+                f.write(" ".join(doc))
+                f.write("\n")
+                doc_count += 1
+        return cls(path, doc_count)
+
+    def __iter__(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                yield line.split()
+
+    def __len__(self):
+        if self.doc_count is None:
+            self.doc_count = sum(1 for _ in self)
+        return self.doc_count
+
+
+class PhrasedCorpus:
+    """The documents from a corpus with bigrams and trigrams joined into one word, made when each one is read
+
+    :parameter
+        corpus : the words of each document, which can be read more than once (TokenCorpus)
+        bigram : the frozen bigram model (FrozenPhrases)
+        trigram : the frozen trigram model (FrozenPhrases)
+        max_docs : the number of documents to read from the start of the corpus (integer), or None for all of them
+    """
+
+    def __init__(self, corpus, bigram, trigram, max_docs=None):
+        self.corpus = corpus
+        self.bigram = bigram
+        self.trigram = trigram
+        self.max_docs = max_docs
+
+    def __iter__(self):
+        for doc in islice(self.corpus, self.max_docs):
+            yield self.trigram[self.bigram[doc]]
+
+    def __len__(self):
+        if self.max_docs is None:
+            return len(self.corpus)
+        return min(self.max_docs, len(self.corpus))
+
+
+def train_phrases(corpus, min_count=5, threshold=100):
+    """Train the bigram model on the corpus and the trigram model on the corpus with bigrams, and freeze both
+
+    :parameter
+        corpus : the words of each document, which is read twice (TokenCorpus)
+        min_count : the fewest times two words must be together to be a phrase (integer)
+        threshold : the lowest score to be a phrase, where a higher threshold gives fewer phrases (integer)
+
+    :return
+        The bigram and trigram models (FrozenPhrases)
+    """
+    bigram = Phrases(corpus, min_count=min_count, threshold=threshold).freeze()
+    trigram = Phrases(bigram[corpus], min_count=min_count, threshold=threshold).freeze()
+    return bigram, trigram
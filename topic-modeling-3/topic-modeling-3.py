@@ -2,6 +2,16 @@
 Copy of example from YouTube series Topic Modeling by Python Tutorials for Digital Humanities (Dr. W.J.B. Mattingly)
 with additional comments and some renaming and functions to make more sense to me.
 Lesson 3 LDA Toipic Modeling
+
+The spaCy pipeline is loaded once and the texts are lemmatized in batches with nlp.pipe,
+using LEMMA_PROCESSES processes, so lemmatizing a large collection is faster with more cores.
+Lemmatized texts are saved in a cache (lemma_cache.py), so running this again on the same texts skips spaCy.
+The LDA model is trained from a corpus saved on disk, on one or more cores, or for several numbers of topics at once
+to pick the one with the best coherence (lda_training.py).
+Bigrams and trigrams are found from the words saved to a file and added to each document as it is read (phrases.py),
+instead of keeping a list of the words, a list with bigrams and a list with trigrams in memory.
+The model is saved with its large arrays in separate files and a header, and loaded with the arrays memory-mapped,
+so worker processes share one copy of them and models that no longer match are rejected (model_store.py).
 """
 
 # Demo started with this and then deleted it.
@@ -9,14 +19,21 @@ Lesson 3 LDA Toipic Modeling
 # import nltk
 # nltk.download("stopwords")
 
+from functools import lru_cache
+from itertools import chain
 import numpy as np
 import json
 import glob
+import os
+import sys
 
 import gensim
 import gensim.corpora as corpora
 from gensim.models import CoherenceModel
 from gensim.models import TfidfModel
+from gensim import matutils
+from gensim.matutils import corpus2csc
+from scipy.sparse import csc_matrix
 
 import spacy
 from nltk.corpus import stopwords
@@ -24,6 +41,44 @@ from nltk.corpus import stopwords
 import pyLDAvis
 import pyLDAvis.gensim
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'topic-modeling-2'))
+from json_stream import iter_items
+from lda_training import best_topic_count, coherence_scores, save_corpus, sweep_topics, train_lda
+from lemma_cache import LemmaCache
+from model_store import load_model, measure_cold_start, save_model
+from phrases import PhrasedCorpus, TokenCorpus, train_phrases
+
+# spaCy model for lemmatization, the number of texts it processes at a time,
+# and the number of processes to use (-1 is one per CPU).
+SPACY_MODEL = "en_core_web_sm"
+LEMMA_BATCH_SIZE = 256
+LEMMA_PROCESSES = -1
+
+# The cache of lemmatized texts and the most MB it can use before the texts used the longest ago are deleted.
+LEMMA_CACHE_PATH = "lemma_cache.sqlite"
+LEMMA_CACHE_MAX_MB = 1024
+
+# The number of topics and the number of processes to train the LDA model with (more than 1 uses LdaMulticore).
+NUM_TOPICS = 15
+LDA_WORKERS = 1
+
+# Numbers of topics to train at the same time and compare by coherence, or None to only train NUM_TOPICS.
+# For example, TOPIC_GRID = range(5, 31, 5)
+TOPIC_GRID = None
+
+# The training corpus is saved here and read from the file while training.
+CORPUS_PATH = "corpus.mm"
+
+# The coherence scores for each number of topics in TOPIC_GRID are saved here,
+# so running again with more numbers of topics only trains the new ones.
+SCORE_CACHE_PATH = "topic_scores.json"
+
+# The words of each document are saved here, one document per line, and read from the file to find phrases.
+TOKENS_PATH = "tokens.txt"
+
+# The model is saved here, with its large arrays in files next to it and a header in MODEL_PATH plus .header.json.
+MODEL_PATH = "test_model.model"
+
 
 def load_data(file):
     with open(file, "r", encoding="utf-8") as f:
@@ -36,37 +91,109 @@ def write_data(file, data):
         json.dump(data, f, indent=4)
 
 
-def lemmatization(texts, allowed_postags=("NOUN", "ADJ", "VERB", "ADV")):
+@lru_cache(maxsize=None)
+def load_nlp(model=SPACY_MODEL):
+    """Load the spaCy pipeline the first time it is needed and return the same one after that.
+    The parser and named entity recognition are not needed for lemmas, so they are disabled to save time."""
+    return spacy.load(model, disable=["parser", "ner"])
+
+
+def iter_lemmatization(texts, allowed_postags=("NOUN", "ADJ", "VERB", "ADV"), batch_size=LEMMA_BATCH_SIZE,
+                       n_process=LEMMA_PROCESSES):
+    """Reduce words to their root, to have less variation, yielding each text as soon as it is done.
+    Texts are sent to spaCy batch_size at a time and split between n_process processes, and come back in order."""
+    # Checks there is at least one text before loading spaCy, which is slow.
+    texts = iter(texts)
+    first_text = next(texts, None)
+    if first_text is None:
+        return
+    nlp = load_nlp()
+    for doc in nlp.pipe(chain([first_text], texts), batch_size=batch_size, n_process=n_process):
+        yield " ".join([token.lemma_ for token in doc if token.pos_ in allowed_postags])
+
+
+def tfidf_scores(bow_matrix, corpus, tfidf):
+    """Calculate the TF-IDF score of every word in every document, as a sparse matrix with one column per document.
+
+    For a TfidfModel with the default settings (the word count times the IDF, scaled so each document has length 1),
+    this is done with arrays for the whole corpus. Otherwise, the model scores each document.
+    """
+    default_model = (tfidf.smartirs is None and tfidf.pivot is None and tfidf.wlocal is gensim.utils.identity
+                     and tfidf.normalize is matutils.unitvec)
+    if not default_model:
+        return corpus2csc(tfidf[corpus], num_terms=bow_matrix.shape[0], num_docs=bow_matrix.shape[1])
+
+    idfs = np.zeros(bow_matrix.shape[0])
+    idfs[list(tfidf.idfs.keys())] = list(tfidf.idfs.values())
+    weights = bow_matrix.data * idfs[bow_matrix.indices]
+
+    # Divides each weight by the length of its document's weights, leaving documents with length 0 at 0.
+    doc_numbers = np.repeat(np.arange(bow_matrix.shape[1]), np.diff(bow_matrix.indptr))
+    lengths = np.sqrt(np.bincount(doc_numbers, weights=weights ** 2, minlength=bow_matrix.shape[1]))
+    scores = np.divide(weights, lengths[doc_numbers], out=np.zeros_like(weights), where=lengths[doc_numbers] > 0)
+    return csc_matrix((scores, bow_matrix.indices, bow_matrix.indptr), shape=bow_matrix.shape)
+
+
+def prune_low_tfidf(corpus, id2word, tfidf, low_value):
+    """Remove words from each document that have a TF-IDF score below low_value in that document,
+    including words with a score of 0, which the TF-IDF model leaves out (for example, words in every document).
+
+    The corpus is converted to a sparse matrix (one column per document) and the scores are calculated for the whole
+    corpus at once with tfidf_matrix, so the words to keep are found with array operations instead of with lists.
+
+    :parameter
+        corpus : the bag of words for each document (list of lists of tuples with the word id and count)
+        id2word : the dictionary (gensim Dictionary)
+        tfidf : the TF-IDF model for the corpus (gensim TfidfModel)
+        low_value : the lowest score to keep (float, above 0)
+
+    :return
+        The corpus without the low value words (list of lists of tuples with the word id and count)
+        and the removed words, in document order (list of strings)
+    """
+    num_terms = len(id2word)
+    bow_matrix = corpus2csc(corpus, num_terms=num_terms, num_docs=len(corpus), dtype=np.int64)
+    tfidf_matrix = tfidf_scores(bow_matrix, corpus, tfidf)
+
+    # Keeps the counts of the words with a high enough score. Missing scores are 0, so those words are removed too.
+    pruned_matrix = bow_matrix.multiply(tfidf_matrix >= low_value).tocsc()
+    pruned_matrix.eliminate_zeros()
+    pruned_matrix.sort_indices()
+    dropped_matrix = (bow_matrix - pruned_matrix).tocsc()
+    dropped_matrix.eliminate_zeros()
+    dropped_matrix.sort_indices()
+
+    # Converts each column back to a list of (word id, count) tuples.
+    pruned_corpus = []
+    for start, end in zip(pruned_matrix.indptr[:-1], pruned_matrix.indptr[1:]):
+        pruned_corpus.append(list(zip(pruned_matrix.indices[start:end].tolist(),
+                                      pruned_matrix.data[start:end].tolist())))
+    dropped_words = [id2word[word_id] for word_id in dropped_matrix.indices.tolist()]
+    return pruned_corpus, dropped_words
+
+
+def lemma_model_key(model=SPACY_MODEL, allowed_postags=("NOUN", "ADJ", "VERB", "ADV")):
+    """Make the key for the lemma cache from the spaCy model, its version, and the parts of speech that are kept,
+    without loading the model."""
+    return f"{model}-{spacy.util.get_package_version(model)}-spacy-{spacy.__version__}-{'+'.join(allowed_postags)}"
+
+
+def lemmatization(texts, allowed_postags=("NOUN", "ADJ", "VERB", "ADV"), batch_size=LEMMA_BATCH_SIZE,
+                  n_process=LEMMA_PROCESSES):
     """Reduce words to their root, to have less variation."""
-    nlp = spacy.load("en_core_web_sm", disable=["parser", "ner"])
-    texts_out = []
-    for text in texts:
-        doc = nlp(text)
-        new_text = []
-        for token in doc:
-            if token.pos_ in allowed_postags:
-                new_text.append(token.lemma_)
-        final = " ".join(new_text)
-        texts_out.append(final)
-    return texts_out
+    return list(iter_lemmatization(texts, allowed_postags, batch_size, n_process))
 
 
-def gen_words(texts):
-    """Reduce text to individual words and remove stop words."""
-    final = []
+def iter_words(texts):
+    """Reduce text to individual words and remove stop words, yielding the words of each text as it is done."""
     for text in texts:
         # deacc is removing accents.
-        new = gensim.utils.simple_preprocess(text, deacc=True)
-        final.append(new)
-    return final
-
+        yield gensim.utils.simple_preprocess(text, deacc=True)
 
-def make_bigrams(texts):
-    return [bigram[doc] for doc in texts]
 
-
-def make_trigrams(texts):
-    return [trigram[bigram[doc]] for doc in texts]
+def gen_words(texts):
+    """Reduce text to individual words and remove stop words."""
+    return list(iter_words(texts))
 
 
 def sublist_sort(sub_li):
@@ -78,75 +205,95 @@ def sublist_sort(sub_li):
     return sub_li
 
 
-# Load English stopwords, which is a list of 179 terms (as of 1/12/2024) we'll ignore.
-stopwords = stopwords.words("english")
-
-# Load text part of the input file (JSON).
-data = load_data("ushmm_dn.json")["texts"]
-
-# Limit variations in the words. Makes the text more machine-readable, less human-readable.
-# It is time consuming; expect it to take a few  minutes.
-lemmatized_texts = lemmatization(data)
-
-# Further clean up the words.
-data_words = gen_words(lemmatized_texts)
-
-# Add bigrams and trigrams to the list of words, modified from www.machinelearningplus.com
-bigrams_phrases = gensim.models.Phrases(data_words, min_count=5, threshold=100)
-trigrams_phrases = gensim.models.Phrases(bigrams_phrases[data_words], threshold=100)
-bigram = gensim.models.phrases.Phraser(bigrams_phrases)
-trigram = gensim.models.phrases.Phrases(trigrams_phrases)
-
-data_bigrams = make_bigrams(data_words)
-data_bigrams_trigrams = make_trigrams(data_bigrams)
-
-# TF-IDF removal of frequently occurring words, which usually are without subject meaning
-# Does risk removing important words that are extremely frequent.
-# Replaces the following code block from making the corpus from the earlier video (commented out).
-# From https://stackoverflow.com/questions/24688116/how-to-filter-out-words-with-low-tf-idf-in-a-corpus-with-gensim/35951190
-id2word = corpora.Dictionary(data_bigrams_trigrams)
-corpus = [id2word.doc2bow(text) for text in data_bigrams_trigrams]
-tfidf = TfidfModel(corpus, id2word=id2word)
-low_value = 0.03
-words = []
-words_missing_in_tfidf = []
-for i in range(0, len(corpus)):
-    bow = corpus[i]
-    tfidf_ids = [id for id, value in tfidf[bow]]
-    bow_ids = [id for id, value in bow]
-    low_value_words = [id for id, value in tfidf[bow] if value < low_value]
-    drops = low_value_words + words_missing_in_tfidf
-    for item in drops:
-        words.append(id2word[item])
-    words_missing_in_tfidf = [id for id in bow_ids if id not in tfidf_ids] # for score of 0
-    new_bow = [b for b in bow if b[0] not in low_value_words and b[0] not in words_missing_in_tfidf]
-    corpus[i] = new_bow
-
-
-# # Make a dictionary with word frequency and makes a list of tuples (corpus),
-# # where the first value is the index number of the word and the second is the word frequency.
-# id2word = corpora.Dictionary(data_words)
-# corpus = []
-# for text in data_words:
-#     new = id2word.doc2bow(text)
-#     corpus.append(new)
-
-# Make the model. Started with 30 topics, knowing that it is too many to demonstrate adjustments.
-# Added the slice to corpus in 03.05 to show using part of your data to train and part, here the last doc, to test.
-lda_model = gensim.models.ldamodel.LdaModel(corpus=corpus[:-1], id2word=id2word, num_topics=15, random_state=100,
-                                            update_every=1, chunksize=100, passes=10, alpha="auto")
-
-# Use model on additional text (the last document left out of initial training)
-# new_vector has the topics sorted in order of most frequent.
-test_doc = corpus[-1]
-vector = lda_model[test_doc]
-new_vector = sublist_sort(vector)
-
-# Save the model and load back into memory under different name to show it works.
-lda_model.save("test_model.model")
-new_model = gensim.models.ldamodel.LdaModel.load("test_model.model")
-
-# # Vizualize the data. This only works in Jupyter notebooks.
-# pyLDAvis.enable_notebook()
-# vis = pyLDAvis.gensim.prepare(lda_model, corpus, id2word, mds="mmds", R=30)
-# vis
+if __name__ == "__main__":
+
+    # Load English stopwords, which is a list of 179 terms (as of 1/12/2024) we'll ignore.
+    stopwords = stopwords.words("english")
+
+    # Load text part of the input file (JSON), one text at a time as it is needed, instead of the whole file at once.
+    # A JSON Lines file with one text per line (ushmm_dn.jsonl) can be used instead.
+    data = iter_items("ushmm_dn.json", "texts")
+
+    # Limit variations in the words. Makes the text more machine-readable, less human-readable.
+    # It is time consuming, so it uses every CPU (LEMMA_PROCESSES) and each text goes to the next step when it is done.
+    # Texts that were lemmatized by an earlier run with the same model are read from the cache instead.
+    with LemmaCache(LEMMA_CACHE_PATH, LEMMA_CACHE_MAX_MB * 1024 * 1024) as lemma_cache:
+        lemmatized_texts = lemma_cache.lemmatize(data, iter_lemmatization, lemma_model_key())
+
+        # Further clean up the words, saving them to a file that is read again for each step instead of a list.
+        data_words = TokenCorpus.write(TOKENS_PATH, iter_words(lemmatized_texts))
+
+    # Add bigrams and trigrams to the list of words, modified from www.machinelearningplus.com
+    # Both models are frozen, which keeps only the phrases, and the phrases are added to each document when it is read.
+    bigram, trigram = train_phrases(data_words, min_count=5, threshold=100)
+    data_bigrams_trigrams = PhrasedCorpus(data_words, bigram, trigram)
+
+    # Every document but the last one, which is left out of training, for the c_v coherence score.
+    train_texts = PhrasedCorpus(data_words, bigram, trigram, max_docs=len(data_words) - 1)
+
+    # TF-IDF removal of frequently occurring words, which usually are without subject meaning
+    # Does risk removing important words that are extremely frequent.
+    # Replaces the following code block from making the corpus from the earlier video (commented out).
+    # From https://stackoverflow.com/questions/24688116/how-to-filter-out-words-with-low-tf-idf-in-a-corpus-with-gensim/35951190
+    # The words missing from the TF-IDF scores (score of 0) are removed from the same document they are missing from.
+    id2word = corpora.Dictionary(data_bigrams_trigrams)
+    corpus = [id2word.doc2bow(text) for text in data_bigrams_trigrams]
+    tfidf = TfidfModel(corpus, id2word=id2word)
+    low_value = 0.03
+    corpus, words = prune_low_tfidf(corpus, id2word, tfidf, low_value)
+
+
+    # # Make a dictionary with word frequency and makes a list of tuples (corpus),
+    # # where the first value is the index number of the word and the second is the word frequency.
+    # id2word = corpora.Dictionary(data_words)
+    # corpus = []
+    # for text in data_words:
+    #     new = id2word.doc2bow(text)
+    #     corpus.append(new)
+
+    # Save the training corpus to disk, so training reads one document at a time from the file.
+    # Added the slice to corpus in 03.05 to show using part of your data to train and part, here the last doc, to test.
+    train_corpus = save_corpus(corpus[:-1], CORPUS_PATH, id2word)
+
+    # Make the model. Started with 30 topics, knowing that it is too many to demonstrate adjustments.
+    # With a TOPIC_GRID, a model is scored for each number of topics and the one with the best coherence is used.
+    # If the best one was scored in an earlier run, it is trained again with the same settings.
+    if TOPIC_GRID:
+        grid_scores, model_paths = sweep_topics(CORPUS_PATH, id2word, TOPIC_GRID, texts=train_texts,
+                                                cache_path=SCORE_CACHE_PATH)
+        for num_topics, scores in sorted(grid_scores.items()):
+            print(f"Coherence for {num_topics} topics: {scores}")
+        best_count = best_topic_count(grid_scores)
+        print(f"Using the model with {best_count} topics")
+        if best_count in model_paths:
+            lda_model = gensim.models.ldamodel.LdaModel.load(model_paths[best_count])
+        else:
+            lda_model = train_lda(train_corpus, id2word, best_count)
+    else:
+        lda_model = train_lda(train_corpus, id2word, NUM_TOPICS, LDA_WORKERS)
+        print(f"Coherence: {coherence_scores(lda_model, train_corpus, id2word, train_texts)}")
+
+    # Use model on additional text (the last document left out of initial training)
+    # new_vector has the topics sorted in order of most frequent.
+    test_doc = corpus[-1]
+    vector = lda_model[test_doc]
+    new_vector = sublist_sort(vector)
+
+    # Save the model and load back into memory under different name to show it works.
+    # The large arrays are memory-mapped read-only, and the header is checked against the dictionary,
+    # so a model trained on other data or saved by an older version is rejected with StaleModelError.
+    save_model(lda_model, MODEL_PATH)
+    new_model = load_model(MODEL_PATH, id2word)
+
+    # Report how long a new worker process takes to load the model and find the topics of the test document,
+    # and the memory it adds, with the arrays memory-mapped (shared between processes) and read into memory.
+    for mmap in ("r", None):
+        cold_start = measure_cold_start(MODEL_PATH, test_doc, mmap)
+        memory = ", ".join(f"{name} {value:.1f} MB" for name, value in cold_start.items() if name.endswith("_mb"))
+        print(f"Cold start with mmap={mmap}: loaded in {cold_start['load_seconds']:.3f} seconds, "
+              f"first topics in {cold_start['first_inference_seconds']:.3f} seconds, added {memory}")
+
+    # # Vizualize the data. This only works in Jupyter notebooks.
+    # pyLDAvis.enable_notebook()
+    # vis = pyLDAvis.gensim.prepare(lda_model, corpus, id2word, mds="mmds", R=30)
+    # vis